@@ -4,9 +4,38 @@ from datetime import datetime, date, timedelta
 import os
 import sys
 import time
+import threading
+import types
+import atexit
+import argparse
 import base64
+import bisect
+import contextlib
+import csv
+import io
+import json
+import sqlite3
+import logging
+import re
+import hashlib
+import multiprocessing
+from collections import Counter, OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
 from PIL import Image
 
+import bim_workers
+from bim_errors import StorageError
+
+# pandas 2: เปิด Copy-on-Write (pandas 3 เปิดอยู่แล้วเสมอ) -> frame ที่ได้จาก cache ร่วมถูกแก้ใน session ไหนก็ไม่ย้อนไปแก้ของเดิม
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+try:
+    import pypdf
+except ImportError:  # ไม่มี pypdf -> ปิดการค้นหาในเนื้อหา PDF อย่างเดียว ส่วนอื่นใช้ได้ปกติ
+    pypdf = None
+
 
 # ==========================================
 # ⚙️ GITHUB / CLOUD CONFIGURATION
@@ -21,8 +50,9 @@ IMG_FOLDER = "profile_images"
 DRAWING_EXCEL = "TR-BKK2-PH1 - Shop Drawing Submission_R0.xlsx"
 RFI_EXCEL = "TR-BKK2-PH1 - Request for Information Submission_R1.xlsx"
 
-MASTER_DRAWING_PATH = os.path.join(DATA_FOLDER, DRAWING_EXCEL)
-MASTER_RFI_PATH = os.path.join(DATA_FOLDER, RFI_EXCEL)
+# หลายโปรเจกต์ใน server เดียว (workbook/PDF/sheet/RFI link แยกกัน) — ไม่มีไฟล์นี้ = โปรเจกต์เดียวตามชื่อไฟล์ด้านบน
+PROJECTS_FILE = os.path.join(DATA_FOLDER, "bim_projects.json")
+DEFAULT_PROJECT = "TR-BKK2-PH1"
 
 STATUS_FILE = os.path.join(DATA_FOLDER, "bim_status.csv")
 CREDENTIALS_FILE = os.path.join(DATA_FOLDER, "bim_users.csv")
@@ -30,23 +60,86 @@ PRIVATE_CHAT_FILE = os.path.join(DATA_FOLDER, "bim_private_chat.csv")
 NOTIFY_FILE = os.path.join(DATA_FOLDER, "bim_notifications.csv")
 RFI_LINKS_FILE = os.path.join(DATA_FOLDER, "bim_drawing_rfi_links.csv")
 
+# Storage ของสถานะทีม/แชท/แจ้งเตือน/RFI link: "sqlite" (ค่าเริ่มต้น, WAL) หรือ "csv" (แบบเดิม)
+STORAGE_BACKEND = os.environ.get("BIM_STORAGE_BACKEND", "sqlite")
+STATE_DB = os.path.join(DATA_FOLDER, "bim_state.db")
+
+# Snapshot ของ Excel ที่ parse แล้ว (parquet) — ใช้ซ้ำจนกว่าไฟล์ต้นฉบับจะเปลี่ยน
+SNAPSHOT_FOLDER = os.path.join(DATA_FOLDER, ".bim_cache")
+SNAPSHOT_VERSION = 2  # เพิ่มเลขนี้เมื่อเปลี่ยนวิธี normalize ข้อมูล เพื่อทิ้ง snapshot เก่า
+
 # Settings
 OFFLINE_TIMEOUT_MINUTES = 5
+# heartbeat เก็บใน memory ก่อน แล้วค่อยเขียนลง storage ทุกกี่วินาที (เปลี่ยนสถานะจะเขียนทันที)
+PRESENCE_FLUSH_SECONDS = 20
+# รอบของงานเบื้องหลัง (เช็คคนที่หายไปเกิน OFFLINE_TIMEOUT_MINUTES)
+OFFLINE_SWEEP_SECONDS = 30
+# ลบแจ้งเตือนที่ผู้รับอ่านแล้วออกจาก log ทุกกี่วินาที
+LOG_COMPACT_SECONDS = 300
+# ส่วน live (แถบสมาชิก / heartbeat + แจ้งเตือน) rerun เองเป็น fragment ทุกกี่วินาที ไม่ต้อง rerun ทั้งหน้า (0 = ปิด)
+LIVE_REFRESH_SECONDS = int(os.environ.get("BIM_LIVE_REFRESH_SECONDS", 10))
+# ข้อความแชทส่วนตัวที่ได้รับ เก็บไว้แสดงใน session ล่าสุดกี่ข้อความ
+CHAT_INBOX_SIZE = 50
+# คำขอ Sync/Relinquish แบบกลุ่ม (พร้อมจำนวนคนที่กด ✅ Done) เก็บใน memory นานกี่ชั่วโมง
+BROADCAST_KEEP_HOURS = 12
+# PDF: cache bytes ร่วมกันทั้ง process ไม่เกิน budget นี้, ไฟล์ใหญ่กว่า threshold อ่านตรงจาก disk ทุกครั้ง ไม่เก็บใน cache
+PDF_CACHE_BYTES = int(os.environ.get("BIM_PDF_CACHE_MB", 128)) * 1024 * 1024
+PDF_UNCACHED_THRESHOLD = 16 * 1024 * 1024
+# register ที่ parse แล้วของทุกโปรเจกต์รวมกันไม่เกิน budget นี้ (เกิน -> ทิ้งส่วนที่ไม่ได้ใช้นานสุด แล้วโหลดใหม่เมื่อมีคนเปิด)
+REGISTER_CACHE_BYTES = int(os.environ.get("BIM_REGISTER_CACHE_MB", 1024)) * 1024 * 1024
+# full-text ของ PDF (ข้อมูลที่สร้างใหม่ได้ -> เก็บใน .bim_cache ของแต่ละโปรเจกต์) และรอบการเช็คไฟล์ใหม่/ไฟล์ถูกแทนที่
+PDF_TEXT_DB_NAME = "pdf_text.db"
+PDF_INDEX_SECONDS = 120
+# Metrics (BIM_METRICS=1): เวลาแต่ละช่วงของ rerun, cache hit, byte ที่อ่าน/เขียน -> ไฟล์ Prometheus text
+METRICS_ENABLED = os.environ.get("BIM_METRICS", "0") == "1"
+METRICS_FILE = os.path.join(SNAPSHOT_FOLDER, "metrics.prom")
+METRICS_EXPORT_SECONDS = 15
+# user ที่เห็น debug panel ใน sidebar (คั่นด้วย comma)
+ADMIN_USERS = [u.strip() for u in os.environ.get("BIM_ADMIN_USERS", "").split(",") if u.strip()]
+# จำนวน process ที่ใช้ parse sheet ของ Excel พร้อมกัน (0/1 = อ่านทีละ sheet แบบเดิม)
+INGEST_WORKERS = int(os.environ.get("BIM_INGEST_WORKERS", min(8, os.cpu_count() or 1)))
+# workbook รวมกันเล็กกว่านี้อ่านใน process เดียว (ค่าเริ่ม worker แพงกว่าเวลาที่ประหยัดได้)
+INGEST_PARALLEL_MIN_BYTES = int(os.environ.get("BIM_INGEST_PARALLEL_MB", 8)) * 1024 * 1024
 
 # Lists
 FILE_LIST = ["AR-LV1", "AR-LV2", "AR-Facade", "ST-Foundation", "ST-Framing",
              "ME-HVAC", "ME-Sanitary", "EE-Lighting", "EE-Power",
              "Central-AR", "Central-ST", "Central-MEP", "Coordination", "Meeting"]
 LEVEL_LIST = ["-", "B1", "L1", "L2", "L3", "L4", "Roof", "Site"]
+# trade = prefix ก่อน "-" ของไฟล์ (ส่งแจ้งเตือนถึงทุกคนที่เปิดไฟล์ของ trade นั้น, "Central" = central model ทั้งหมด)
+FILE_TRADES = sorted({f.split("-")[0] for f in FILE_LIST if "-" in f})
 
 SHEET_MAPPING = {
     "AR": "Architectural", "ST": "Structural", "CSD": "Combined Services",
     "ME": "Mechanical", "EL": "Electrical", "HY": "Hydraulics", "FI": "Fire Protection"
 }
-SHEETS_TO_READ = list(SHEET_MAPPING.keys())
-
 
-def init_files():
+STATUS_COLUMNS = ["Name", "Current_File", "Level", "Task_Detail", "Last_Updated", "Last_Seen", "Status"]
+CHAT_COLUMNS = ["Timestamp", "From_User", "To_User", "Message"]
+NOTIFY_COLUMNS = ["To_User", "From_User", "Type", "Message", "Timestamp"]
+LINK_COLUMNS = ["Drawing_RFAS", "Linked_RFI"]
+# คอลัมน์วันที่ของ register (datetime64, ไม่มีค่า = NaT) และรูปแบบตอนแสดงผล
+DRAWING_DATE_COLUMNS = ["Planned Submission", "Submission Date", "Consultant Respond Date", "Approval Date"]
+RFI_DATE_COLUMNS = ["Actual Submission Date"]
+DATE_FORMAT = "%d %b %Y"
+# คอลัมน์ที่ค่าซ้ำกันเยอะ -> category, และคอลัมน์เลขเอกสารที่ใช้เป็น key (join/lookup)
+DRAWING_CATEGORY_COLUMNS = ["Trade", "Revision", "Action", "Status"]
+RFI_CATEGORY_COLUMNS = ["Trade", "Action By", "Approved Status"]
+
+# สีสถานะของ Drawing (ลำดับ = ลำดับความสำคัญของเงื่อนไข)
+COLOR_APPROVED = "🟢 Approved/Closed"
+COLOR_OVERDUE_BLOCKED = "🟣 Overdue & Blocked"
+COLOR_OVERDUE = "🔴 Overdue"
+COLOR_PENDING = "🟡 Pending"
+COLOR_NORMAL = "⚪ Normal"
+STATUS_COLORS = [COLOR_APPROVED, COLOR_OVERDUE_BLOCKED, COLOR_OVERDUE, COLOR_PENDING, COLOR_NORMAL]
+# สีสถานะ -> style class ของแถวในตาราง (Normal ไม่ลงสี)
+DRAWING_STYLE_CLASSES = {COLOR_APPROVED: "approved", COLOR_OVERDUE_BLOCKED: "overdue_blocked",
+                         COLOR_OVERDUE: "overdue", COLOR_PENDING: "pending"}
+
+
+def init_files(metrics=None):
+    metrics = metrics or get_metrics()
     # สร้างโฟลเดอร์ถ้ายังไม่มี
     if not os.path.exists(DATA_FOLDER) and DATA_FOLDER != ".":
         os.makedirs(DATA_FOLDER)
@@ -69,6 +162,7 @@ def init_files():
     else:
         # เช็คว่ามีชื่อ Weera หรือยัง (เพื่อดูว่าเป็นไฟล์เวอร์ชั่นเก่าไหม)
         df_cred = pd.read_csv(CREDENTIALS_FILE)
+        metrics.io(_csv_io_kind(CREDENTIALS_FILE), "read", os.path.getsize(CREDENTIALS_FILE))
         if "Weera" not in df_cred['Username'].values:
             need_create_cred = True
 
@@ -80,11 +174,13 @@ def init_files():
 
     # 🟢 3. สร้าง/อัพเดทไฟล์ Status
     # ถ้าไฟล์ไม่มี หรือยังเป็นชื่อเก่า (Member_1...) ให้รีเซ็ตใหม่ให้ตรงกับชื่อจริง
+    # backend sqlite: ไฟล์นี้เป็นแค่ต้นทาง migrate ครั้งแรก -> ไม่ต้องอ่านทั้งไฟล์ทุก rerun เมื่อมี DB แล้ว
     need_reset_status = False
     if not os.path.exists(STATUS_FILE):
         need_reset_status = True
-    else:
+    elif STORAGE_BACKEND == "csv" or not os.path.exists(STATE_DB):
         df_status = pd.read_csv(STATUS_FILE)
+        metrics.io(_csv_io_kind(STATUS_FILE), "read", os.path.getsize(STATUS_FILE))
         # เช็คว่าชื่อในไฟล์ตรงกับรายชื่อจริงหรือไม่
         existing_names = df_status['Name'].tolist()
         # ถ้าไม่มี "Weera" ในไฟล์ แสดงว่าเป็นไฟล์เก่าที่ต้องแก้
@@ -104,242 +200,1741 @@ def init_files():
         }).to_csv(STATUS_FILE, index=False)
 
     if not os.path.exists(PRIVATE_CHAT_FILE):
-        pd.DataFrame(columns=["Timestamp", "From_User", "To_User", "Message"]).to_csv(PRIVATE_CHAT_FILE, index=False)
+        pd.DataFrame(columns=CHAT_COLUMNS).to_csv(PRIVATE_CHAT_FILE, index=False)
 
     if not os.path.exists(NOTIFY_FILE):
-        pd.DataFrame(columns=["To_User", "From_User", "Type", "Message", "Timestamp"]).to_csv(NOTIFY_FILE, index=False)
+        pd.DataFrame(columns=NOTIFY_COLUMNS).to_csv(NOTIFY_FILE, index=False)
 
     if not os.path.exists(RFI_LINKS_FILE):
-        pd.DataFrame(columns=["Drawing_RFAS", "Linked_RFI"]).to_csv(RFI_LINKS_FILE, index=False)
+        pd.DataFrame(columns=LINK_COLUMNS).to_csv(RFI_LINKS_FILE, index=False)
 
 
-def load_data(file_path):
+def _csv_io_kind(file_path):
+    # label ของ I/O metric ต่อไฟล์ CSV: bim_status.csv -> "csv.bim_status"
+    return "csv." + os.path.splitext(os.path.basename(file_path))[0]
+
+
+def load_data(file_path, metrics=None):
     if not os.path.exists(file_path): return pd.DataFrame()
     try:
-        return pd.read_csv(file_path).fillna("")
+        size = os.path.getsize(file_path)
+        df = pd.read_csv(file_path).fillna("")
     except:
         return pd.DataFrame()
+    (metrics or get_metrics()).io(_csv_io_kind(file_path), "read", size)
+    return df
 
 
-def save_data(df, file_path):
+def save_data(df, file_path, metrics=None):
     try:
         df.to_csv(file_path, index=False)
-    except:
-        pass
+        size = os.path.getsize(file_path)
+    except Exception as e:
+        raise StorageError(f"Cannot write {file_path}: {e}") from e
+    (metrics or get_metrics()).io(_csv_io_kind(file_path), "write", size)
 
 
-def save_rfi_link(drawing_rfas, rfi_string):
-    df_links = load_data(RFI_LINKS_FILE)
-    if not df_links.empty:
-        df_links = df_links[df_links['Drawing_RFAS'] != drawing_rfas]
-    new_row = pd.DataFrame([{"Drawing_RFAS": drawing_rfas, "Linked_RFI": rfi_string}])
-    df_final = pd.concat([df_links, new_row], ignore_index=True)
-    save_data(df_final, RFI_LINKS_FILE)
+def save_rfi_link(drawing_rfas, rfi_string, project=None):
+    get_project_store((project or get_project()).key).set_link(drawing_rfas, rfi_string)
 
 
-# Cache Data Loading
-@st.cache_data(ttl=60)
-def load_rfi_data_global():
-    return _read_rfi_excel()
+# ------------------------------------------------------------------
+# 📈 METRICS (timing span / cache hit / I/O bytes; ปิดอยู่ = แทบไม่มี overhead)
+# ------------------------------------------------------------------
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("metrics", "phase", "start")
+
+    def __init__(self, metrics, phase):
+        self.metrics, self.phase = metrics, phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.phase, time.perf_counter() - self.start)
+
+
+class Metrics:
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}  # phase -> [count ต่อ bucket (+inf ตัวสุดท้าย), sum, count]
+        self._counters = {}  # (metric, labels) -> value
+
+    def span(self, phase):
+        # with get_metrics().span("drawing.filter"): ...
+        if not self.enabled: return _NULL_SPAN
+        return _Span(self, phase)
+
+    def observe(self, phase, seconds):
+        if not self.enabled: return
+        with self._lock:
+            hist = self._histograms.setdefault(phase, [[0] * (len(self.BUCKETS) + 1), 0.0, 0])
+            hist[0][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            hist[1] += seconds
+            hist[2] += 1
+
+    def count(self, metric, value=1, **labels):
+        if not self.enabled: return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def cache(self, cache, hit):
+        self.count("bim_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+    def io(self, kind, direction, nbytes):
+        self.count("bim_io_bytes_total", nbytes, kind=kind, direction=direction)
+
+    def phase_frame(self):
+        # ตารางสรุปสำหรับ debug panel: จำนวนครั้ง, เฉลี่ย, p95 (ขอบบนของ bucket)
+        with self._lock:
+            items = [(p, list(h[0]), h[1], h[2]) for p, h in self._histograms.items()]
+        rows = []
+        for phase, buckets, total, count in sorted(items):
+            cumulative, p95 = 0, float("inf")
+            for bound, n in zip(self.BUCKETS + (float("inf"),), buckets):
+                cumulative += n
+                if cumulative >= 0.95 * count:
+                    p95 = bound
+                    break
+            rows.append({"Phase": phase, "Count": count, "Mean (ms)": round(total / count * 1000, 2),
+                         "p95 <= (ms)": p95 * 1000})
+        return pd.DataFrame(rows)
+
+    def cache_frame(self):
+        with self._lock:
+            counters = dict(self._counters)
+        ratios = {}
+        for (metric, labels), value in counters.items():
+            if metric != "bim_cache_requests_total": continue
+            labels = dict(labels)
+            ratios.setdefault(labels["cache"], {"hit": 0, "miss": 0})[labels["result"]] += value
+        return pd.DataFrame([{"Cache": c, "Hits": r["hit"], "Misses": r["miss"],
+                              "Hit ratio": round(r["hit"] / (r["hit"] + r["miss"]), 3)}
+                             for c, r in sorted(ratios.items())])
+
+    def io_frame(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return pd.DataFrame([dict(labels, Bytes=value) for (metric, labels), value in sorted(counters.items())
+                             if metric == "bim_io_bytes_total"])
+
+    def prometheus_text(self):
+        with self._lock:
+            histograms = {p: (list(h[0]), h[1], h[2]) for p, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = ["# TYPE bim_phase_seconds histogram"]
+        for phase, (buckets, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, n in zip(self.BUCKETS + (float("inf"),), buckets):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'bim_phase_seconds_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+            lines.append(f'bim_phase_seconds_sum{{phase="{phase}"}} {total:.6f}')
+            lines.append(f'bim_phase_seconds_count{{phase="{phase}"}} {count}')
+        for metric in sorted({m for m, _ in counters}):
+            lines.append(f"# TYPE {metric} counter")
+            for (m, labels), value in sorted(counters.items()):
+                if m != metric: continue
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, file_path):
+        if not self.enabled: return
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, file_path)
+
+
+@st.cache_resource
+def get_metrics():
+    return Metrics(METRICS_ENABLED)
 
 
-@st.cache_data(ttl=60)
-def load_drawing_excel(rfi_status_map):
-    return _read_drawing_excel(rfi_status_map)
+# ------------------------------------------------------------------
+# 🗄️ STORAGE BACKEND (สถานะทีม / แชท / แจ้งเตือน / RFI link)
+# ------------------------------------------------------------------
+log = logging.getLogger("bim_tracker")
+
+
+class AppendOnlyLog:
+    # CSV แบบ append-only: ส่ง = ต่อท้ายไฟล์ 1 ครั้ง (ไม่เขียนทั้งไฟล์ใหม่)
+    # index ใน memory: user -> byte offset ของแต่ละแถว, cursor ต่อ user เก็บใน <ไฟล์>.cursors.json
+    # -> อ่านรายการใหม่ = seek ไปเฉพาะแถวของ user ที่อยู่หลัง cursor
+    def __init__(self, file_path, columns, user_column, metrics=None):
+        self.file_path = file_path
+        self.columns = columns
+        self.metrics = metrics or Metrics(False)
+        self._io_kind = _csv_io_kind(file_path)
+        self._user_idx = columns.index(user_column)
+        self._cursor_path = file_path + ".cursors.json"
+        self._lock = threading.Lock()
+        self._index = {}
+        self._indexed_to = 0
+        try:
+            with open(self._cursor_path, "r", encoding="utf-8") as f:
+                self._cursors = json.load(f)
+        except (OSError, ValueError):
+            self._cursors = {}
 
+    @staticmethod
+    def _parse_line(line):
+        return next(csv.reader([line.decode("utf-8").rstrip("\r\n")]), [])
 
-def _read_rfi_excel():
-    if not os.path.exists(MASTER_RFI_PATH): return pd.DataFrame(), {}
-    all_data = []
-    rfi_map = {}
+    def _refresh_index(self):
+        # index เพิ่มเฉพาะส่วนที่ต่อท้ายมาตั้งแต่ครั้งก่อน
+        try:
+            size = os.path.getsize(self.file_path)
+        except OSError:
+            return
+        if size < self._indexed_to:
+            self._index, self._indexed_to = {}, 0  # ไฟล์ถูก compact / แทนที่
+        if size == self._indexed_to: return
+
+        self.metrics.io(self._io_kind, "read", size - self._indexed_to)
+        with open(self.file_path, "rb") as f:
+            f.seek(self._indexed_to)
+            if self._indexed_to == 0:
+                f.readline()  # header
+                self._indexed_to = f.tell()
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.endswith(b"\n"): break  # จบไฟล์ / แถวที่ยังเขียนไม่เสร็จ
+                record = self._parse_line(line)
+                if len(record) > self._user_idx:
+                    self._index.setdefault(record[self._user_idx], []).append(offset)
+                self._indexed_to = f.tell()
+
+    def append(self, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([str(row.get(c, "")).replace("\r", " ").replace("\n", " ") for c in self.columns])
+        data = buf.getvalue()
+        with self._lock:
+            new_file = not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0
+            with open(self.file_path, "a", newline="", encoding="utf-8") as f:
+                if new_file: csv.writer(f).writerow(self.columns)
+                f.write(data)
+        self.metrics.io(self._io_kind, "write", len(data.encode("utf-8")))
+
+    def read_new(self, user):
+        with self._lock:
+            self._refresh_index()
+            offsets = self._index.get(user, [])
+            offsets = offsets[bisect.bisect_right(offsets, self._cursors.get(user, -1)):]
+            if not offsets: return []
+
+            records, nbytes = [], 0
+            with open(self.file_path, "rb") as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    line = f.readline()
+                    nbytes += len(line)
+                    records.append(self._parse_line(line))
+            self.metrics.io(self._io_kind, "read", nbytes)
+            self._cursors[user] = offsets[-1]
+            _write_json_atomic(self._cursor_path, self._cursors)
+        return [dict(zip(self.columns, r + [""] * (len(self.columns) - len(r)))) for r in records]
+
+    def compact(self):
+        # เขียนไฟล์ใหม่โดยตัดแถวที่ผู้รับอ่านแล้วออก (ทำในงานเบื้องหลัง ไม่ใช่ตอนอ่าน)
+        with self._lock:
+            self._refresh_index()
+            acked = sum(bisect.bisect_right(self._index.get(u, []), c) for u, c in self._cursors.items())
+            if not acked: return 0
+
+            keep = []
+            with open(self.file_path, "rb") as f:
+                header = f.readline()
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line: break
+                    record = self._parse_line(line)
+                    user = record[self._user_idx] if len(record) > self._user_idx else ""
+                    if offset > self._cursors.get(user, -1): keep.append(line)
+                self.metrics.io(self._io_kind, "read", f.tell())
+
+            # reset cursor ก่อนแทนไฟล์: ถ้าพังกลางทาง อย่างแย่คือส่งซ้ำ ไม่ใช่หาย
+            self._cursors = {}
+            _write_json_atomic(self._cursor_path, self._cursors)
+            tmp_path = self.file_path + ".tmp"
+            data = header + b"".join(keep)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.file_path)
+            self.metrics.io(self._io_kind, "write", len(data))
+            self._index, self._indexed_to = {}, 0
+            return acked
+
+
+class CsvStore:
+    # แบบเดิม: อ่านทั้งไฟล์ -> แก้ -> เขียนทั้งไฟล์ (lock กันชนกันเองภายใน process เดียว)
+    # ยกเว้นแชท/แจ้งเตือนที่เป็น AppendOnlyLog: ส่งเข้ามาเฉพาะ store ของทีม (get_store) ซึ่งเป็นเจ้าของไฟล์นั้น
+    # store ของโปรเจกต์อื่นดูแลแค่ RFI link -> ไม่มี index/cursor ของไฟล์ทีมซ้อนกันหลายชุด
+    def __init__(self, links_file=RFI_LINKS_FILE, chat=None, notifications=None):
+        self.links_file = links_file
+        self._lock = threading.Lock()
+        self._chat = chat
+        self._notifications = notifications
+
+    def status_frame(self):
+        df = load_data(STATUS_FILE)
+        if df.empty or 'Name' not in df.columns: return pd.DataFrame(columns=STATUS_COLUMNS)
+        return df
+
+    def get_member(self, name):
+        df = self.status_frame()
+        rows = df[df['Name'] == name]
+        return None if rows.empty else rows.iloc[0].to_dict()
+
+    def upsert_members(self, rows):
+        # rows: {name: {column: value}}
+        with self._lock:
+            df = self.status_frame()
+            for name, fields in rows.items():
+                idx = df.index[df['Name'] == name].tolist()
+                if idx:
+                    for col, val in fields.items():
+                        df.at[idx[0], col] = val
+                else:
+                    new_row = dict({"Current_File": "Idle", "Level": "-", "Task_Detail": "-", "Status": "Offline"},
+                                   Name=name, **fields)
+                    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+            save_data(df, STATUS_FILE)
+
+    def upsert_member(self, name, fields):
+        self.upsert_members({name: fields})
+
+    def append_private_message(self, row):
+        self._chat.append([row])
+
+    def read_private_messages(self, user):
+        return self._chat.read_new(user)
+
+    def append_notifications(self, rows):
+        self._notifications.append(rows)  # ต่อท้ายไฟล์ครั้งเดียวทั้งกลุ่ม
+
+    def read_notifications(self, user):
+        return self._notifications.read_new(user)
+
+    def compact_logs(self):
+        return self._notifications.compact()
+
+    def links_frame(self):
+        return load_data(self.links_file)
+
+    def set_link(self, drawing_rfas, rfi_string):
+        with self._lock:
+            df_links = load_data(self.links_file)
+            if not df_links.empty:
+                df_links = df_links[df_links['Drawing_RFAS'] != drawing_rfas]
+            new_row = pd.DataFrame([{"Drawing_RFAS": drawing_rfas, "Linked_RFI": rfi_string}])
+            save_data(pd.concat([df_links, new_row], ignore_index=True), self.links_file)
 
-    for sheet in SHEETS_TO_READ:
+    def links_version(self):
+        return file_version(self.links_file)
+
+    def export_csv(self):
+        pass  # ข้อมูลเป็น CSV อยู่แล้ว
+
+
+class SqlitePool:
+    # connection ของ SQLite ใช้ซ้ำข้าม thread: Streamlit รันแต่ละ rerun บน thread ใหม่, fragment/scheduler/PDF index ก็มี thread ของตัวเอง
+    # -> ยืม connection ที่ว่างอยู่แล้วคืนเมื่อเสร็จ (จำนวน connection = จำนวนที่ใช้พร้อมกันจริง ไม่เพิ่มตาม thread ที่เคยรัน)
+    def __init__(self, db_path, pragmas=()):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self._idle = []
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.pop()
+        except IndexError:
+            # check_same_thread=False: ใช้ทีละ thread เสมอ (ยืมแล้วคืน) แต่คนละ thread กับที่เปิด
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+            for pragma in self.pragmas: conn.execute(pragma)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction: conn.execute("ROLLBACK")  # ไม่ค้าง transaction ไปให้คนยืมต่อ
+            self._idle.append(conn)
+
+
+def _row_bytes(rows):
+    # I/O metric ของ SQLite = ขนาดข้อมูลในแถวที่ส่งเข้า/อ่านออก (UTF-8) ไม่ใช่ byte ของ page บนดิสก์
+    return sum(len(str(v).encode("utf-8")) for row in rows for v in row)
+
+
+class SqliteStore:
+    # SQLite WAL: อ่านพร้อมกันได้ระหว่างมีคนเขียน, แก้ทีละแถวด้วย upsert แทนการเขียนทั้งไฟล์
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS status (
+            Name TEXT PRIMARY KEY, Current_File TEXT DEFAULT 'Idle', Level TEXT DEFAULT '-',
+            Task_Detail TEXT DEFAULT '-', Last_Updated TEXT DEFAULT '', Last_Seen TEXT DEFAULT '',
+            Status TEXT DEFAULT 'Offline');
+        CREATE TABLE IF NOT EXISTS private_chat (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, Timestamp TEXT, From_User TEXT, To_User TEXT, Message TEXT);
+        CREATE INDEX IF NOT EXISTS idx_private_chat_to ON private_chat (To_User, id);
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, To_User TEXT, From_User TEXT, Type TEXT, Message TEXT,
+            Timestamp TEXT);
+        CREATE INDEX IF NOT EXISTS idx_notifications_to ON notifications (To_User, id);
+        CREATE TABLE IF NOT EXISTS read_cursors (log TEXT, user TEXT, last_id INTEGER, PRIMARY KEY (log, user));
+        CREATE TABLE IF NOT EXISTS rfi_links (Drawing_RFAS TEXT PRIMARY KEY, Linked_RFI TEXT);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+    # table -> (ไฟล์ CSV เดิม, คอลัมน์)
+    CSV_TABLES = {
+        "status": (STATUS_FILE, STATUS_COLUMNS),
+        "private_chat": (PRIVATE_CHAT_FILE, CHAT_COLUMNS),
+        "notifications": (NOTIFY_FILE, NOTIFY_COLUMNS),
+        "rfi_links": (RFI_LINKS_FILE, LINK_COLUMNS),
+    }
+
+    def __init__(self, db_path, csv_tables=None, metrics=None):
+        # csv_tables: ตารางที่ migrate/export กับ CSV (store ของโปรเจกต์อื่นมีแค่ rfi_links)
+        self.db_path = db_path
+        self.metrics = metrics or Metrics(False)
+        self.csv_tables = self.CSV_TABLES if csv_tables is None else csv_tables
+        self._pool = SqlitePool(db_path, ["PRAGMA synchronous=NORMAL", "PRAGMA busy_timeout=10000"])
+        with self._pool.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+        self._migrate_csv()
+
+    def _write(self, fn, nbytes=0):
+        # 1 transaction ต่อการแก้ 1 ครั้ง; BEGIN IMMEDIATE จอง write lock ก่อนอ่าน -> ไม่มี lost update
+        try:
+            with self._pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(conn)
+                    conn.execute("COMMIT")
+                    if nbytes: self.metrics.io("sqlite", "write", nbytes)
+                    return result
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            raise StorageError(f"Cannot write {self.db_path}: {e}") from e
+
+    def _query(self, sql, params=()):
+        with self._pool.connection() as conn:
+            df = pd.read_sql_query(sql, conn, params=params).fillna("")
+        self.metrics.io("sqlite", "read", _row_bytes(df.itertuples(index=False, name=None)))
+        return df
+
+    def _migrate_csv(self):
+        # ย้ายข้อมูลจาก CSV เดิมเข้า DB ครั้งเดียว (ครั้งแรกที่สร้าง DB)
+        def migrate(conn):
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_migrated'").fetchone(): return
+            for table, (file_path, columns) in self.csv_tables.items():
+                df = load_data(file_path, self.metrics)
+                if df.empty: continue
+                df = df.reindex(columns=columns).fillna("").astype(str)
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    df.itertuples(index=False, name=None))
+            conn.execute("INSERT INTO meta (key, value) VALUES ('csv_migrated', ?)",
+                         (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+
+        self._write(migrate)
+
+    def status_frame(self):
+        return self._query(f"SELECT {', '.join(STATUS_COLUMNS)} FROM status")
+
+    def get_member(self, name):
+        with self._pool.connection() as conn:
+            row = conn.execute(f"SELECT {', '.join(STATUS_COLUMNS)} FROM status WHERE Name = ?", (name,)).fetchone()
+        if row is not None: self.metrics.io("sqlite", "read", _row_bytes([row]))
+        return None if row is None else {c: ("" if v is None else v) for c, v in zip(STATUS_COLUMNS, row)}
+
+    def upsert_members(self, rows):
+        def upsert(conn):
+            for name, fields in rows.items():
+                cols = ["Name"] + list(fields)
+                updates = ", ".join(f"{c} = excluded.{c}" for c in fields) or "Name = Name"
+                conn.execute(
+                    f"INSERT INTO status ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+                    f"ON CONFLICT(Name) DO UPDATE SET {updates}",
+                    [name] + [str(v) for v in fields.values()])
+
+        self._write(upsert, _row_bytes([name, *fields.values()] for name, fields in rows.items()))
+
+    def upsert_member(self, name, fields):
+        self.upsert_members({name: fields})
+
+    def append_private_message(self, row):
+        values = [row[c] for c in CHAT_COLUMNS]
+        self._write(lambda conn: conn.execute(
+            f"INSERT INTO private_chat ({', '.join(CHAT_COLUMNS)}) VALUES (?, ?, ?, ?)", values), _row_bytes([values]))
+
+    def append_notifications(self, rows):
+        # ทั้งกลุ่มใน transaction เดียว
+        values = [[row[c] for c in NOTIFY_COLUMNS] for row in rows]
+        self._write(lambda conn: conn.executemany(
+            f"INSERT INTO notifications ({', '.join(NOTIFY_COLUMNS)}) VALUES (?, ?, ?, ?, ?)", values),
+            _row_bytes(values))
+
+    def _read_new(self, table, columns, user):
+        # log แบบ append-only + cursor ต่อ user: อ่าน = seek ด้วย index (To_User, id) หลัง cursor
+        # อ่านกับเลื่อน cursor ใน transaction เดียว (BEGIN IMMEDIATE) -> 2 tab ของ user เดียวกันไม่ได้รายการเดียวกันซ้ำ
+        def read(conn):
+            row = conn.execute("SELECT last_id FROM read_cursors WHERE log = ? AND user = ?", (table, user)).fetchone()
+            rows = conn.execute(f"SELECT id, {', '.join(columns)} FROM {table} WHERE To_User = ? AND id > ? ORDER BY id",
+                                (user, row[0] if row else 0)).fetchall()
+            if rows:
+                conn.execute("INSERT INTO read_cursors (log, user, last_id) VALUES (?, ?, ?) "
+                             "ON CONFLICT(log, user) DO UPDATE SET last_id = excluded.last_id",
+                             (table, user, rows[-1][0]))
+            return rows
+
+        rows = self._write(read)
+        self.metrics.io("sqlite", "read", _row_bytes(r[1:] for r in rows))
+        return [dict(zip(columns, r[1:])) for r in rows]
+
+    def read_private_messages(self, user):
+        return self._read_new("private_chat", CHAT_COLUMNS, user)
+
+    def read_notifications(self, user):
+        return self._read_new("notifications", NOTIFY_COLUMNS, user)
+
+    def compact_logs(self):
+        # ลบแจ้งเตือนที่ผู้รับอ่านแล้ว (แชทเก็บไว้เป็นประวัติ)
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM notifications WHERE id <= COALESCE((SELECT last_id FROM read_cursors "
+            "WHERE log = 'notifications' AND user = notifications.To_User), 0)").rowcount)
+
+    def links_frame(self):
+        return self._query(f"SELECT {', '.join(LINK_COLUMNS)} FROM rfi_links ORDER BY rowid")
+
+    def set_link(self, drawing_rfas, rfi_string):
+        def upsert(conn):
+            # ลบแล้วใส่ใหม่ -> แถวล่าสุดอยู่ท้ายเหมือน CSV เดิม
+            conn.execute("DELETE FROM rfi_links WHERE Drawing_RFAS = ?", (drawing_rfas,))
+            conn.execute("INSERT INTO rfi_links (Drawing_RFAS, Linked_RFI) VALUES (?, ?)", (drawing_rfas, rfi_string))
+            conn.execute("INSERT INTO meta (key, value) VALUES ('links_version', '1') "
+                         "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+        self._write(upsert, _row_bytes([[drawing_rfas, rfi_string]]))
+
+    def links_version(self):
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'links_version'").fetchone()
+        return row[0] if row else "0"
+
+    def export_csv(self):
+        # เขียนกลับเป็น CSV รูปแบบเดิม (ใช้กับเครื่องมือเดิม / สลับกลับไปใช้ backend csv)
+        for table, (file_path, columns) in self.csv_tables.items():
+            order = "id" if table in ("private_chat", "notifications") else "rowid"
+            save_data(self._query(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order}"), file_path,
+                      self.metrics)
+
+
+class TeamSignals:
+    # เลข version ใน memory ต่อหัวข้อ ("presence", ("notify", user)) ให้ fragment เช็คทุกรอบแบบ O(1)
+    # แล้วทำงานจริง (อ่าน store / สร้าง HTML ใหม่) เฉพาะเมื่อเลขเปลี่ยน; 1 server process เหมือน PresenceRegistry
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, topic):
+        with self._lock:
+            self._versions[topic] = self._versions.get(topic, 0) + 1
+
+    def version(self, topic):
+        return self._versions.get(topic, 0)
+
+
+class PresenceRegistry:
+    # สถานะสมาชิกใน memory ใช้ร่วมกันทุก session: heartbeat/อ่าน = O(1) ไม่แตะดิสก์
+    # เขียนลง store แบบ write-behind (รวบ heartbeat แล้ว flush ตามรอบ หรือทันทีเมื่อสถานะเปลี่ยน)
+    # หมายเหตุ: ถือว่า 1 server process เป็นเจ้าของสถานะ (Streamlit รันแบบ process เดียว)
+    # สิ่งที่แถบสมาชิกแสดง (ชื่อ/สถานะ) เปลี่ยน -> bump "presence"; heartbeat ที่แค่เลื่อน Last_Seen ไม่นับ
+    def __init__(self, store, signals=None):
+        self._store = store
+        self._signals = signals or TeamSignals()
+        self._lock = threading.Lock()
+        self._members = {row['Name']: row for row in store.status_frame().to_dict('records')}
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+
+    def get(self, name):
+        with self._lock:
+            member = self._members.get(name)
+            return None if member is None else dict(member)
+
+    def frame(self):
+        with self._lock:
+            rows = [dict(m) for m in self._members.values()]
+        return pd.DataFrame(rows, columns=STATUS_COLUMNS).fillna("")
+
+    def heartbeat(self, name, last_seen, last_updated):
+        with self._lock:
+            member = self._members.get(name)
+            status_changed = False
+            if member is None:
+                # User ใหม่
+                member = {"Name": name, "Current_File": "Idle", "Level": "-", "Task_Detail": "-", "Status": "Online"}
+                self._members[name] = member
+                status_changed = True
+            else:
+                # ถ้าสถานะเดิมเป็น Offline/ว่าง -> เปลี่ยนเป็น Online
+                current_stat = str(member.get('Status', ''))
+                if "Offline" in current_stat or current_stat == "nan" or current_stat == "":
+                    member['Status'] = "Online"
+                    status_changed = True
+            member['Last_Seen'] = last_seen
+            member['Last_Updated'] = last_updated
+            self._dirty.add(name)
+            due = time.monotonic() - self._last_flush >= PRESENCE_FLUSH_SECONDS
+
+        if status_changed: self._signals.bump("presence")
+        if status_changed or due:
+            self.flush()
+
+    def update_many(self, rows):
+        # เปลี่ยนสถานะโดยตรง (ปุ่ม Update Status / auto-offline) -> flush ทันที
+        with self._lock:
+            for name, fields in rows.items():
+                member = self._members.setdefault(
+                    name, {"Name": name, "Current_File": "Idle", "Level": "-", "Task_Detail": "-",
+                           "Last_Updated": "", "Last_Seen": "", "Status": "Offline"})
+                member.update(fields)
+                self._dirty.add(name)
+        self._signals.bump("presence")
+        self.flush()
+
+    def update(self, name, fields):
+        self.update_many({name: fields})
+
+    def mark_offline(self, seen):
+        # seen: {name: Last_Seen ตอนที่ sweep ตรวจ} -> ข้ามคนที่ heartbeat เข้ามาระหว่างนั้น
+        changed = False
+        with self._lock:
+            for name, last_seen in seen.items():
+                member = self._members.get(name)
+                if member is None or member.get('Last_Seen') != last_seen: continue
+                member['Status'] = "⚫ Offline"
+                member['Current_File'] = "Idle"
+                self._dirty.add(name)
+                changed = True
+        if changed: self._signals.bump("presence")
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty: return
+            rows = {name: {c: self._members[name].get(c, "") for c in STATUS_COLUMNS if c != "Name"}
+                    for name in self._dirty}
+            self._dirty.clear()
+            self._last_flush = time.monotonic()
         try:
-            df = pd.read_excel(MASTER_RFI_PATH, sheet_name=sheet, header=1)
+            self._store.upsert_members(rows)
+        except StorageError:
+            with self._lock:
+                self._dirty.update(rows)  # เขียนไม่ได้ -> เก็บไว้ลองใหม่รอบหน้า
+            raise
+
+
+@st.cache_resource
+def get_store():
+    if STORAGE_BACKEND == "csv":
+        return CsvStore(chat=AppendOnlyLog(PRIVATE_CHAT_FILE, CHAT_COLUMNS, "To_User", get_metrics()),
+                        notifications=AppendOnlyLog(NOTIFY_FILE, NOTIFY_COLUMNS, "To_User", get_metrics()))
+    return SqliteStore(STATE_DB, metrics=get_metrics())
+
+
+class BackgroundScheduler:
+    # daemon thread 1 ตัวต่อ server process รันงานเป็นรอบ ๆ แทนการทำในทุก rerun ของทุก session
+    def __init__(self, metrics=None):
+        self.metrics = metrics or Metrics(False)
+        self._jobs = {}  # name -> [interval, fn, next_run]
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="bim-scheduler", daemon=True)
+        self._thread.start()
+
+    def every(self, name, seconds, fn, delay=None):
+        # delay = เวลาก่อนรันครั้งแรก (default รอครบ 1 รอบก่อน)
+        with self._lock:
+            self._jobs.setdefault(name, [seconds, fn, time.monotonic() + (seconds if delay is None else delay)])
+
+    def _run(self):
+        while True:
+            with self._lock:
+                due = [(name, job) for name, job in self._jobs.items() if job[2] <= time.monotonic()]
+            for name, job in due:
+                try:
+                    with self.metrics.span(f"job.{name}"):
+                        job[1]()
+                except Exception:
+                    log.exception("background job %s failed", name)
+                job[2] = time.monotonic() + job[0]
+            time.sleep(1)
+
+
+@st.cache_resource
+def get_signals():
+    return TeamSignals()
+
+
+class BroadcastBoard:
+    # คำขอแบบกลุ่ม (Sync / Relinquish ถึงทุกคนในไฟล์/trade): ส่ง = append แจ้งเตือนครั้งเดียวทั้งกลุ่ม
+    # ผู้รับกด ✅ Done -> ผู้ส่งเห็นว่าใครทำแล้ว/ยังไม่ทำ; เก็บใน memory ของ server process (เหมือน PresenceRegistry)
+    def __init__(self, store, signals=None):
+        self._store = store
+        self._signals = signals or TeamSignals()
+        self._lock = threading.Lock()
+        self._requests = OrderedDict()  # id -> request (เรียงตามเวลาส่ง)
+        self._next_id = 1
+
+    def send(self, from_user, recipients, msg_type, group):
+        recipients = [u for u in dict.fromkeys(recipients) if u != from_user]
+        if not recipients: return None
+        now = datetime.now()
+        self._store.append_notifications(
+            [{"To_User": u, "From_User": from_user, "Type": msg_type, "Message": f"Action: {msg_type} ({group})",
+              "Timestamp": now.strftime("%H:%M")} for u in recipients])
+        with self._lock:
+            self._prune(now)
+            request_id = self._next_id
+            self._next_id += 1
+            self._requests[request_id] = {"id": request_id, "From_User": from_user, "Type": msg_type, "Group": group,
+                                          "Sent": now, "Recipients": recipients, "Acked": {}}
+        for u in recipients: self._signals.bump(("notify", u))
+        return request_id
+
+    def ack(self, request_id, user):
+        with self._lock:
+            request = self._requests.get(request_id)
+            if request is None or user not in request["Recipients"]: return False
+            request["Acked"].setdefault(user, datetime.now())
+            return True
+
+    def pending(self, user):
+        # คำขอที่ส่งถึง user แล้วยังไม่กด Done
+        with self._lock:
+            return [dict(r, Acked=dict(r["Acked"])) for r in self._requests.values()
+                    if user in r["Recipients"] and user not in r["Acked"]]
+
+    def sent(self, user, limit=5):
+        # คำขอล่าสุดที่ user ส่ง (ใหม่ก่อน)
+        with self._lock:
+            requests = [dict(r, Acked=dict(r["Acked"])) for r in reversed(self._requests.values())
+                        if r["From_User"] == user]
+        return requests[:limit]
+
+    def _prune(self, now):
+        cutoff = now - timedelta(hours=BROADCAST_KEEP_HOURS)
+        while self._requests and next(iter(self._requests.values()))["Sent"] < cutoff:
+            self._requests.popitem(last=False)
+
+
+@st.cache_resource
+def get_broadcasts():
+    return BroadcastBoard(get_store(), get_signals())
+
+
+@st.cache_resource
+def get_presence():
+    registry = PresenceRegistry(get_store(), get_signals())
+    atexit.register(registry.flush)  # ปิด server -> เขียน heartbeat ที่ค้างอยู่ลง storage
+    return registry
+
+
+@st.cache_resource
+def get_scheduler():
+    presence = get_presence()
+    metrics = get_metrics()
+    scheduler = BackgroundScheduler(metrics)
+    scheduler.every("auto-offline", OFFLINE_SWEEP_SECONDS, lambda: sweep_offline(presence, thai_now()))
+    scheduler.every("presence-flush", PRESENCE_FLUSH_SECONDS, presence.flush)
+    scheduler.every("log-compaction", LOG_COMPACT_SECONDS, get_store().compact_logs)
+    if metrics.enabled:
+        scheduler.every("metrics-export", METRICS_EXPORT_SECONDS, lambda: metrics.export(METRICS_FILE))
+    return scheduler
 
-            def get_col(kw):
-                for c in df.columns:
-                    if any(k in str(c).lower() for k in kw): return c
-                return None
 
-            c_doc = get_col(["doc ref", "rfas doc"])
-            c_act = get_col(["action"])
-            c_desc = get_col(["description", "title"])
-            c_stat = get_col(["approved status", "status"])
-            c_sub = get_col(["submission date"])
+# ------------------------------------------------------------------
+# 🏗️ PROJECT REGISTRY (หลายโปรเจกต์/เฟสใน server เดียว)
+# ------------------------------------------------------------------
+class Project:
+    # workbook ทั้งสอง + โฟลเดอร์ PDF + sheet mapping + ที่เก็บ RFI link ของ 1 โปรเจกต์
+    # DEFAULT_PROJECT ใช้ path เดิมทั้งหมด (ข้อมูล/cache ที่มีอยู่ใช้ต่อได้), โปรเจกต์อื่นแยกไฟล์ตาม key
+    def __init__(self, key, drawing_excel, rfi_excel, name=None, folder=DATA_FOLDER, pdf_folder=None,
+                 sheet_mapping=None, state_db=None, links_file=None):
+        legacy = key == DEFAULT_PROJECT
+        self.key = key
+        self.name = name or key
+        self.drawing_excel = drawing_excel
+        self.rfi_excel = rfi_excel
+        self.drawing_path = os.path.join(folder, drawing_excel)
+        self.rfi_path = os.path.join(folder, rfi_excel)
+        self.pdf_folder = pdf_folder or (RFI_FOLDER if legacy else os.path.join(RFI_FOLDER, key))
+        self.sheet_mapping = sheet_mapping or SHEET_MAPPING
+        self.cache_folder = SNAPSHOT_FOLDER if legacy else os.path.join(SNAPSHOT_FOLDER, key)
+        self.state_db = state_db or (STATE_DB if legacy else os.path.join(folder, f"bim_state_{key}.db"))
+        self.links_file = links_file or (
+            RFI_LINKS_FILE if legacy else os.path.join(folder, f"bim_drawing_rfi_links_{key}.csv"))
+
+    def sources(self):
+        # workbook ที่มีไฟล์อยู่จริง: {kind: path}
+        return {kind: path for kind, path in [("rfi", self.rfi_path), ("drawing", self.drawing_path)]
+                if os.path.exists(path)}
+
+
+def load_projects(file_path=PROJECTS_FILE):
+    # {"TR-BKK2-PH2": {"drawing_excel": "...", "rfi_excel": "...", "pdf_folder": "...", "sheet_mapping": {...}}}
+    if not os.path.exists(file_path):
+        return {DEFAULT_PROJECT: Project(DEFAULT_PROJECT, DRAWING_EXCEL, RFI_EXCEL)}
+    with open(file_path, "r", encoding="utf-8") as f:
+        return {key: Project(key, **spec) for key, spec in json.load(f).items()}
+
+
+@st.cache_resource
+def get_projects():
+    # อ่าน registry ครั้งเดียวต่อ process (เพิ่ม/แก้โปรเจกต์ = restart)
+    return load_projects()
+
+
+def get_project(key=None):
+    projects = get_projects()
+    return projects.get(key) or projects.get(DEFAULT_PROJECT) or next(iter(projects.values()))
+
+
+@st.cache_resource
+def get_project_store(key):
+    # store ของ RFI link; โปรเจกต์ที่ชี้ไฟล์เดียวกับทีม (DEFAULT_PROJECT) ใช้ store ของทีมตัวเดิม
+    project = get_project(key)
+    if STORAGE_BACKEND == "csv":
+        return get_store() if project.links_file == RFI_LINKS_FILE else CsvStore(project.links_file)
+    if project.state_db == STATE_DB: return get_store()
+    return SqliteStore(project.state_db, {"rfi_links": (project.links_file, LINK_COLUMNS)}, get_metrics())
 
-            if c_doc:
-                temp = pd.DataFrame()
-                temp["Doc Ref No."] = df[c_doc]
-                temp["Trade"] = SHEET_MAPPING.get(sheet, sheet)
 
-                temp["Document Description"] = df[c_desc] if c_desc else "-"
-                temp["Action By"] = df[c_act] if c_act else "-"
-                temp["Approved Status"] = df[c_stat] if c_stat else "-"
+# ------------------------------------------------------------------
+# 💾 WORKBOOK SNAPSHOT CACHE
+# ------------------------------------------------------------------
+def _hash_file(file_path):
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
-                for _, row in temp.iterrows():
-                    rfi_map[str(row["Doc Ref No."]).strip()] = str(row["Action By"]).strip().upper()
 
-                if c_sub:
-                    temp["Actual Submission Date"] = df[c_sub]
-                else:
-                    temp["Actual Submission Date"] = "-"
+def _file_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": _hash_file(file_path)}
 
-                all_data.append(temp.dropna(subset=["Doc Ref No."]))
-        except:
-            pass
 
-    if not all_data: return pd.DataFrame(), {}
-    final_df = pd.concat(all_data, ignore_index=True)
+def _snapshot_paths(name, folder=SNAPSHOT_FOLDER):
+    base = os.path.join(folder, name)
+    return base + ".parquet", base + ".json"
+
+
+def _write_json_atomic(file_path, obj):
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
 
-    def clean_dt(val):
-        if pd.isnull(val): return "-"
-        if not isinstance(val, (datetime, date)):
+
+def load_snapshot(name, source_path, folder=SNAPSHOT_FOLDER, sheet_mapping=SHEET_MAPPING):
+    data_path, meta_path = _snapshot_paths(name, folder)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAPSHOT_VERSION: return None
+        if meta.get("sheets") != sheet_mapping: return None  # Trade มาจาก mapping
+
+        stat = os.stat(source_path)
+        if meta["size"] != stat.st_size: return None
+        if meta["mtime_ns"] != stat.st_mtime_ns:
+            # mtime เปลี่ยนแต่ขนาดเท่าเดิม -> เช็ค hash ว่าเนื้อไฟล์เปลี่ยนจริงไหม
+            if _hash_file(source_path) != meta["sha1"]: return None
+            meta["mtime_ns"] = stat.st_mtime_ns
+            _write_json_atomic(meta_path, meta)
+
+        return pd.read_parquet(data_path), meta.get("extra", {})
+    except Exception:
+        return None
+
+
+def save_snapshot(name, fingerprint, df, extra, folder=SNAPSHOT_FOLDER):
+    data_path, meta_path = _snapshot_paths(name, folder)
+    try:
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = data_path + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, data_path)
+        # เขียน meta ทีหลังสุด -> meta ที่อ่านได้ต้องชี้ไป parquet ที่สมบูรณ์เสมอ
+        _write_json_atomic(meta_path, dict(fingerprint, version=SNAPSHOT_VERSION, extra=extra))
+    except Exception:
+        pass  # snapshot เป็นแค่ cache -> เขียนไม่ได้ก็แค่ parse ใหม่รอบหน้า
+
+
+def _normalize_frame(df):
+    # คอลัมน์ object ที่ปนชนิด (str/int) เก็บลง parquet ไม่ได้ -> แปลงเป็น str ให้เหมือนกันทั้งตอน parse และตอนอ่าน snapshot
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = df[c].astype(str)
+    return df
+
+
+def _compact_frame(kind, df):
+    # ค่าซ้ำเยอะ -> category (code 1 byte ต่อแถว, string op ทำครั้งเดียวต่อค่า)
+    # เลขเอกสารที่ยังเป็น Python str (pandas ที่ไม่ได้ใช้ string dtype ของ Arrow) -> intern ให้ทุก frame/map ชี้ object เดียวกัน
+    if df.empty: return df
+    categories, key = _COMPACT_COLUMNS[kind]
+    for c in categories:
+        if c in df.columns: df[c] = df[c].astype("category")
+    if df[key].dtype == object:
+        df[key] = df[key].map(lambda v: sys.intern(v) if isinstance(v, str) else v)
+    return df
+
+
+def _unreadable_workbook(kind, path, error):
+    # ไฟล์เสีย/บันทึกค้างครึ่งเดียว/Excel lock อยู่ -> ตารางว่างของ workbook นั้น ไม่ล้มทั้ง app
+    # ไม่เขียน snapshot และใส่ "error" ใน extra ให้ load_workbooks นับไว้ -> rerun ถัดไปอ่านใหม่
+    log.warning("cannot read %s workbook %s: %s", kind, path, error)
+    return pd.DataFrame(), {"error": str(error)}
+
+
+def load_workbook_snapshots(sources, folder=SNAPSHOT_FOLDER, sheet_mapping=SHEET_MAPPING, metrics=None, pool=None):
+    # sources: {kind: path} -> {kind: (df, extra)}
+    # ใช้ snapshot ถ้าได้, ที่เหลือ parse พร้อมกันทุก workbook ทีเดียว
+    metrics = metrics or get_metrics()
+    results, fingerprints = {}, {}
+    for kind, path in sources.items():
+        cached = load_snapshot(kind, path, folder, sheet_mapping)
+        metrics.cache("snapshot", cached is not None)
+        if cached is not None:
+            metrics.io("snapshot", "read", file_version(_snapshot_paths(kind, folder)[0])[0])
+            results[kind] = (_compact_frame(kind, cached[0]), cached[1])
+        else:
+            # เก็บ fingerprint ก่อน parse: ถ้าไฟล์ถูกแก้ระหว่าง parse รอบหน้าจะไม่ตรงและ parse ใหม่
             try:
-                val = pd.to_datetime(val)
-            except:
-                return str(val)
-        if pd.isna(val): return "-"
-        if val.year <= 1900: return "-"
-        return val.strftime('%d %b %Y')
+                fingerprints[kind] = dict(_file_fingerprint(path), sheets=sheet_mapping)
+            except OSError as e:
+                results[kind] = _unreadable_workbook(kind, path, e)
+
+    if fingerprints:
+        for kind in fingerprints:
+            metrics.io("workbook", "read", fingerprints[kind]["size"])
+        parsed = parse_workbooks({kind: sources[kind] for kind in fingerprints}, sheet_mapping, pool)
+        for kind, frames in parsed.items():
+            if isinstance(frames, Exception):
+                results[kind] = _unreadable_workbook(kind, sources[kind], frames)
+                continue
+            df, extra = _FRAME_FINALIZERS[kind](frames)
+            if not df.empty:
+                df = _compact_frame(kind, _normalize_frame(df))
+                save_snapshot(kind, fingerprints[kind], df, extra, folder)
+            results[kind] = (df, extra)
+    return results
+
+
+def _to_dates(values):
+    # ค่าวันที่จาก Excel -> datetime64 ระดับวัน; ว่าง/แปลงไม่ได้/ปี <= 1900 (ค่า 0 ของ Excel) = NaT
+    # เก็บเป็นวันที่จริงใน register แล้วค่อยจัดรูปแบบตอนแสดงผล (DATE_FORMAT)
+    dates = pd.to_datetime(values, errors='coerce').dt.normalize()
+    return dates.where(dates.dt.year > 1900)
+
+
+def _fill_text(df):
+    # ค่าว่างของคอลัมน์ข้อความ = "-" (คอลัมน์วันที่คง NaT ไว้)
+    return df.fillna({c: "-" for c in df.columns if not pd.api.types.is_datetime64_any_dtype(df[c])})
+
 
-    if "Actual Submission Date" in final_df.columns:
-        final_df["Actual Submission Date"] = pd.to_datetime(final_df["Actual Submission Date"], errors='coerce').apply(
-            clean_dt)
+# ------------------------------------------------------------------
+# ⚡ PARALLEL INGESTION (1 workbook ต่อ worker process, งานอยู่ใน bim_workers)
+# ------------------------------------------------------------------
+def worker_context():
+    # forkserver/spawn: ไม่ fork process ออกจาก server ที่มีหลาย thread (lock ที่ thread อื่นถืออยู่จะค้างใน child)
+    # forkserver โหลด __main__ (ไฟล์ที่รัน ซึ่ง worker ทุกตัวต้อง import ก่อนเริ่มงาน) กับ bim_workers ครั้งเดียว
+    # แล้ว fork worker จาก process นั้น -> worker แต่ละตัวไม่ต้อง import streamlit/pandas ใหม่
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    if ctx.get_start_method() == "forkserver": ctx.set_forkserver_preload(["__main__", "bim_workers"])
+    return ctx
+
+
+def _frames_or_error(read):
+    # error ของ workbook นั้นเอง -> คืน exception แทนผล (pool พังทั้งตัวยังโยนต่อให้ถอยไปอ่านแบบ serial)
+    try:
+        return read()
+    except BrokenExecutor:
+        raise
+    except Exception as e:
+        return e
 
-    return final_df.fillna("-"), rfi_map
 
+def _parse_workbooks_serial(sources, sheet_mapping):
+    return {kind: _frames_or_error(lambda: bim_workers.parse_workbook(kind, path, sheet_mapping))
+            for kind, path in sources.items()}
 
-def _read_drawing_excel(rfi_status_map):
-    if not os.path.exists(MASTER_DRAWING_PATH): return pd.DataFrame(), "File Not Found"
 
-    df_links = load_data(RFI_LINKS_FILE)
-    links_dict = {}
-    if not df_links.empty:
-        links_dict = dict(zip(df_links['Drawing_RFAS'], df_links['Linked_RFI']))
+def _parse_workbooks_parallel(sources, sheet_mapping, pool=None):
+    # pool ที่ส่งมา (เช่นของ run_reports) ใช้ร่วมกันหลายงาน -> ไม่ปิดที่นี่
+    with contextlib.nullcontext(pool) if pool is not None else \
+            ProcessPoolExecutor(max_workers=min(INGEST_WORKERS, len(sources)), mp_context=worker_context()) as pool:
+        futures = {kind: pool.submit(bim_workers.parse_workbook, kind, path, sheet_mapping)
+                   for kind, path in sources.items()}
+        return {kind: _frames_or_error(future.result) for kind, future in futures.items()}
 
-    all_data = []
 
-    for sheet in SHEETS_TO_READ:
+def parse_workbooks(sources, sheet_mapping=SHEET_MAPPING, pool=None):
+    # sources: {kind: path} -> {kind: [DataFrame ของแต่ละ sheet ตามลำดับใน sheet_mapping] หรือ exception ถ้าอ่านไม่ได้}
+    # แยก process เฉพาะเมื่อมีหลาย workbook และใหญ่พอ หรือผู้เรียกส่ง pool มาเอง; pool ใช้ไม่ได้ -> log แล้วอ่านแบบ serial
+    if pool is not None or INGEST_WORKERS > 1 and len(sources) > 1 and \
+            sum(os.path.getsize(path) for path in sources.values()) >= INGEST_PARALLEL_MIN_BYTES:
         try:
-            df = pd.read_excel(MASTER_DRAWING_PATH, sheet_name=sheet, header=1)
-
-            def find_col(pats, exclude=None):
-                for c in df.columns:
-                    c_str = str(c).lower()
-                    if any(p in c_str for p in pats):
-                        if exclude and exclude in c_str:
-                            continue
-                        return c
-                return None
-
-            c_rfas = find_col(["rfas"])
-            c_desc = find_col(["description", "title"])
-            if not c_desc and len(df.columns) > 3: c_desc = df.columns[3]
-
-            if c_rfas:
-                temp = pd.DataFrame()
-                temp["RFAS Doc No."] = df[c_rfas]
-                temp["Trade"] = SHEET_MAPPING.get(sheet, sheet)
-                temp["Document Description"] = df[c_desc] if c_desc else "-"
-
-                c_plan = find_col(["planned"])
-                c_sub = find_col(["submission"], exclude="planned")
-                c_res = find_col(["respond"])
-                c_app = find_col(["approval"])
-
-                temp["Planned Submission"] = df[c_plan] if c_plan else None
-                temp["Submission Date"] = df[c_sub] if c_sub else None
-                temp["Consultant Respond Date"] = df[c_res] if c_res else None
-                temp["Approval Date"] = df[c_app] if c_app else None
-
-                c_rev = find_col(["rev"])
-                temp["Revision"] = df[c_rev] if c_rev else "-"
-                c_act = find_col(["action"])
-                temp["Action"] = df[c_act] if c_act else "-"
-                c_stat = find_col(["status"])
-                temp["Status"] = df[c_stat] if c_stat else "-"
-
-                link_list = []
-                block_list = []
-                for _, row in temp.iterrows():
-                    rfas = str(row["RFAS Doc No."])
-                    l_rfi = links_dict.get(rfas, "")
-                    is_blocked = False
-
-                    if l_rfi:
-                        rfis = [x.strip() for x in l_rfi.split(',')]
-                        for r in rfis:
-                            act = rfi_status_map.get(r, "PENDING")
-                            if not any(x in act for x in ["CLOSED"]):
-                                is_blocked = True
-
-                    link_list.append(l_rfi)
-                    block_list.append(is_blocked)
-
-                temp["Linked RFI"] = link_list
-                temp["Is_Blocked"] = block_list
-
-                all_data.append(temp.dropna(subset=["RFAS Doc No."]))
-        except:
-            pass
-
-    if not all_data: return pd.DataFrame(), "No Data"
-    final = pd.concat(all_data, ignore_index=True)
+            return _parse_workbooks_parallel(sources, sheet_mapping, pool)
+        except Exception:
+            log.warning("parallel workbook parse failed, parsing serially", exc_info=True)
+    return _parse_workbooks_serial(sources, sheet_mapping)
 
-    def clean_dt(val):
-        if pd.isnull(val): return "-"
-        if not isinstance(val, (datetime, date)):
-            try:
-                val = pd.to_datetime(val)
-            except:
-                return str(val)
-        if pd.isna(val): return "-"
-        if val.year <= 1900: return "-"
-        return val.strftime('%d %b %Y')
 
-    for c in ["Planned Submission", "Submission Date", "Consultant Respond Date", "Approval Date"]:
-        final[c] = pd.to_datetime(final[c], errors='coerce').apply(clean_dt)
+# ------------------------------------------------------------------
+# 🔗 DEPENDENCY-TRACKED CACHE (คำนวณใหม่เฉพาะส่วนที่ dependency เปลี่ยน)
+# ------------------------------------------------------------------
+def estimate_bytes(value):
+    # ขนาดโดยประมาณของค่าใน cache (DataFrame / numpy / SearchIndex / tuple / dict) สำหรับคุม budget
+    if isinstance(value, pd.DataFrame): return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)): return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray): return value.nbytes
+    if isinstance(value, (tuple, list)): return sum(estimate_bytes(v) for v in value)
+    if isinstance(value, dict): return sum(sys.getsizeof(k) + estimate_bytes(v) for k, v in value.items())
+    if hasattr(value, "__dict__"): return estimate_bytes(vars(value))
+    return sys.getsizeof(value)
+
+
+def shared_view(value):
+    # ค่าจาก cache ร่วมที่ส่งให้ session: DataFrame -> shallow copy (CoW, ไม่ copy ข้อมูล), dict -> อ่านอย่างเดียว
+    # session ไหนเพิ่ม/แก้คอลัมน์ก็ไม่กระทบ entry ใน cache และไม่มีใคร copy ทั้ง frame เผื่อไว้
+    if isinstance(value, pd.DataFrame): return value.copy(deep=False)
+    if isinstance(value, tuple): return tuple(shared_view(v) for v in value)
+    if isinstance(value, dict): return types.MappingProxyType(value)
+    return value
+
+
+class DependencyCache:
+    # (scope, name) -> (deps, value, bytes) ใช้ร่วมกันทุก session/ทุกโปรเจกต์ใน process (scope = key ของโปรเจกต์)
+    # get() คำนวณใหม่เมื่อ deps ไม่ตรงเท่านั้น; ขนาดรวมเกิน max_bytes -> ทิ้ง entry ที่ไม่ได้ใช้นานสุด (LRU)
+    def __init__(self, max_bytes=None, metrics=None):
+        self.max_bytes = max_bytes
+        self.metrics = metrics or Metrics(False)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, name, deps, compute, scope=None):
+        # lock ต่อ entry: หลาย session ขอพร้อมกันก็ parse แค่ครั้งเดียว
+        key = (scope, name)
+        with self._lock_for(key):
+            with self._guard:
+                entry = self._entries.get(key)
+                hit = entry is not None and entry[0] == deps
+                if hit: self._entries.move_to_end(key)
+            self.metrics.cache(f"register.{name}", hit)
+            if hit:
+                return shared_view(entry[1])
+            with self.metrics.span(f"compute.{name}"):
+                value = compute()
+            self._put(key, deps, value)
+            return shared_view(value)
+
+    def _put(self, key, deps, value):
+        size = estimate_bytes(value) if self.max_bytes else 0
+        with self._guard:
+            old = self._entries.pop(key, None)
+            if old is not None: self._bytes -= old[2]
+            self._entries[key] = (deps, value, size)
+            self._bytes += size
+            # entry ที่เพิ่งใส่ไม่ถูกทิ้ง (ถึงจะใหญ่กว่า budget เองก็ตาม) -> session ที่ขออยู่ได้ค่าเสมอ
+            while self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1:
+                (scope, _), (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.metrics.count("bim_register_evictions_total", project=scope)
+
+    def invalidate(self, name, scope=None):
+        key = (scope, name)
+        with self._lock_for(key), self._guard:
+            old = self._entries.pop(key, None)
+            if old is not None: self._bytes -= old[2]
+
+    def usage_frame(self):
+        # หน่วยความจำต่อโปรเจกต์ (debug panel)
+        with self._guard:
+            usage = {}
+            for (scope, _), (_, _, size) in self._entries.items():
+                entries, total = usage.get(scope, (0, 0))
+                usage[scope] = (entries + 1, total + size)
+        return pd.DataFrame([{"Project": scope, "Entries": n, "MB": round(size / 1024 / 1024, 1)}
+                             for scope, (n, size) in usage.items()])
+
+
+def file_version(file_path):
+    # version แบบถูก (stat อย่างเดียว) สำหรับเช็คทุก rerun; เนื้อไฟล์จริงเช็คด้วย hash ใน snapshot อีกชั้น
+    try:
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+def rfi_links_version(project):
+    return get_project_store(project.key).links_version()
+
+
+@st.cache_resource
+def get_register_cache():
+    return DependencyCache(REGISTER_CACHE_BYTES, get_metrics())
+
+
+@st.cache_resource
+def get_workbook_read_failures():
+    # path -> จำนวนครั้งที่อ่าน workbook ไม่สำเร็จ (ร่วมทั้ง process)
+    return Counter()
+
+
+def workbook_version(file_path):
+    # version ที่ใช้เป็น deps ของ register: อ่านพลาด = version ใหม่ -> ผลว่างที่ cache ไว้ใช้ไม่ได้ rerun ถัดไปอ่านใหม่
+    # (ต้องอ่าน deps ก่อนค่าที่มันครอบ ไม่งั้นผลจากรอบที่พลาดจะถูกเก็บคู่กับ version หลังพลาด)
+    return file_version(file_path), get_workbook_read_failures()[file_path]
+
+
+def load_workbooks(project):
+    # ขึ้นกับ fingerprint ของทั้งสอง workbook; ถ้าต้อง parse ก็ parse พร้อมกันทั้งคู่
+    deps = (workbook_version(project.rfi_path), workbook_version(project.drawing_path))
+
+    def compute():
+        sources = project.sources()
+        results = load_workbook_snapshots(sources, project.cache_folder, project.sheet_mapping)
+        for kind, (_, extra) in results.items():
+            if "error" in extra: get_workbook_read_failures()[sources[kind]] += 1
+        return results
+
+    return get_register_cache().get("workbooks", deps, compute, scope=project.key)
+
+
+def load_rfi_data_global(project=None):
+    project = project or get_project()
+
+    def compute():
+        df_rfi, rfi_map = _rfi_result(load_workbooks(project))
+        return (classify_rfis(df_rfi) if not df_rfi.empty else df_rfi), rfi_map
+
+    return get_register_cache().get("rfi", (workbook_version(project.rfi_path),), compute, scope=project.key)
+
+
+def load_drawing_excel(project=None, today=None):
+    # drawing = workbook (fingerprint) + blocking (link store version, RFI map version) + สี (today)
+    # บันทึก link ใหม่ -> คำนวณใหม่แค่ blocking/สี ไม่ต้องอ่าน Excel ซ้ำ
+    project = project or get_project()
+    today = today or date.today()
+    cache = get_register_cache()
+    links_version = rfi_links_version(project)
+    deps = _drawing_deps(project, links_version)
+    _, rfi_map = load_rfi_data_global(project)
+    link_table = cache.get("rfi_links", (links_version,), lambda: load_rfi_link_table(project), scope=project.key)
+
+    df_drawing, msg = cache.get("drawing", deps,
+                                lambda: _drawing_result(load_workbooks(project), rfi_map, link_table),
+                                scope=project.key)
+    if df_drawing.empty: return df_drawing, msg
+    return cache.get("drawing_status", deps + (today,), lambda: (classify_drawings(df_drawing, today), msg),
+                     scope=project.key)
+
+
+def _drawing_deps(project, links_version=None):
+    return (workbook_version(project.rfi_path), workbook_version(project.drawing_path),
+            rfi_links_version(project) if links_version is None else links_version)
+
+
+def load_drawing_cube(project=None, today=None):
+    # ขึ้นกับทุกอย่างที่สี/สถานะขึ้นกับ (เหมือน drawing_status)
+    project = project or get_project()
+    today = today or date.today()
+    deps = _drawing_deps(project) + (today,)
+    df_drawing, _ = load_drawing_excel(project, today)
+    return get_register_cache().get("drawing_cube", deps,
+                                    lambda: DrawingCube(df_drawing), scope=project.key)
+
+
+def load_drawing_search_index(project=None):
+    # token ไม่ขึ้นกับ link/สี -> สร้างใหม่เมื่อ workbook เปลี่ยนเท่านั้น
+    project = project or get_project()
+    deps = (workbook_version(project.rfi_path), workbook_version(project.drawing_path))
+    df_drawing, _ = load_drawing_excel(project)
+    return get_register_cache().get("drawing_search", deps,
+                                    lambda: SearchIndex(df_drawing, DRAWING_SEARCH_COLUMNS), scope=project.key)
+
+
+def load_rfi_search_index(project=None):
+    project = project or get_project()
+    deps = (workbook_version(project.rfi_path),)
+    df_rfi, _ = load_rfi_data_global(project)
+    return get_register_cache().get("rfi_search", deps,
+                                    lambda: SearchIndex(df_rfi, RFI_SEARCH_COLUMNS), scope=project.key)
+
+
+def _read_rfi_excel(project=None):
+    project = project or get_project()
+    if not os.path.exists(project.rfi_path): return pd.DataFrame(), {}
+    return _rfi_result(load_workbook_snapshots({"rfi": project.rfi_path}, project.cache_folder,
+                                               project.sheet_mapping))
+
+
+def _read_drawing_excel(rfi_status_map, project=None):
+    project = project or get_project()
+    if not os.path.exists(project.drawing_path): return pd.DataFrame(), "File Not Found"
+    return _drawing_result(load_workbook_snapshots({"drawing": project.drawing_path}, project.cache_folder,
+                                                   project.sheet_mapping), rfi_status_map)
+
+
+def _rfi_result(snapshots):
+    if "rfi" not in snapshots: return pd.DataFrame(), {}
+    final_df, extra = snapshots["rfi"]
+    if final_df.empty: return pd.DataFrame(), {}
+    return final_df, extra.get("rfi_map", {})
+
+
+def _drawing_result(snapshots, rfi_status_map, link_table=None):
+    if "drawing" not in snapshots: return pd.DataFrame(), "File Not Found"
+    final, _ = snapshots["drawing"]
+    if final.empty: return pd.DataFrame(), "No Data"
+    return _apply_rfi_blocking(final, rfi_status_map, link_table), "OK"
+
+
+def _finalize_rfi_frames(frames):
+    all_data = [f for f in frames if f is not None]
+    if not all_data: return pd.DataFrame(), {}
+    final_df = pd.concat(all_data, ignore_index=True)
+
+    rfi_map = {}
+    for doc, act in zip(final_df["Doc Ref No."], final_df["Action By"]):
+        rfi_map[str(doc).strip()] = str(act).strip().upper()
+
+    for c in RFI_DATE_COLUMNS:
+        if c in final_df.columns: final_df[c] = _to_dates(final_df[c])
+
+    return _fill_text(final_df), {"rfi_map": rfi_map}
+
+
+def build_rfi_link_table(df_links):
+    # bim_drawing_rfi_links.csv ("RFI-1, RFI-2" ต่อ 1 drawing) -> ตาราง normalized 1 แถวต่อคู่ (Drawing_RFAS, RFI)
+    if df_links.empty or "Drawing_RFAS" not in df_links.columns:
+        return pd.DataFrame(columns=["Drawing_RFAS", "Linked_RFI", "RFI"])
+    links = df_links[["Drawing_RFAS", "Linked_RFI"]].astype(str)
+    links = links.drop_duplicates("Drawing_RFAS", keep="last")  # แถวหลังทับแถวก่อน (เหมือน dict เดิม)
+    links = links[links["Linked_RFI"] != ""]
+    pairs = links.assign(RFI=links["Linked_RFI"].str.split(",")).explode("RFI", ignore_index=True)
+    pairs["RFI"] = pairs["RFI"].str.strip()
+    return pairs
+
+
+def load_rfi_link_table(project=None):
+    return build_rfi_link_table(get_project_store((project or get_project()).key).links_frame())
+
+
+def read_project_links(project):
+    # อ่าน RFI link ตรงจากไฟล์แบบ read-only (ไม่สร้าง store/DB) สำหรับงาน batch นอก Streamlit
+    if STORAGE_BACKEND != "csv" and os.path.exists(project.state_db):
+        with contextlib.closing(sqlite3.connect(f"file:{project.state_db}?mode=ro", uri=True)) as conn:
+            return pd.read_sql_query(f"SELECT {', '.join(LINK_COLUMNS)} FROM rfi_links ORDER BY rowid",
+                                     conn).fillna("")
+    return load_data(project.links_file)  # ยังไม่เคยสร้าง DB -> ข้อมูลยังอยู่ใน CSV เดิม
+
+
+def _apply_rfi_blocking(final, rfi_status_map, link_table=None):
+    if link_table is None: link_table = load_rfi_link_table()
+
+    # join คู่ (drawing, rfi) กับสถานะ RFI: RFI ที่ไม่อยู่ใน map ถือเป็น PENDING
+    status = pd.DataFrame({"RFI": list(rfi_status_map.keys()), "Action": list(rfi_status_map.values())},
+                          columns=["RFI", "Action"])
+    merged = link_table.merge(status, on="RFI", how="left")
+    is_open = ~merged["Action"].fillna("PENDING").astype(str).str.contains("CLOSED", regex=False)
+    blocked_drawings = merged.loc[is_open, "Drawing_RFAS"].unique()
+
+    link_by_drawing = link_table.drop_duplicates("Drawing_RFAS").set_index("Drawing_RFAS")["Linked_RFI"]
+    keys = final["RFAS Doc No."].astype(str)
+
+    final = final.copy(deep=False)  # เพิ่มคอลัมน์อย่างเดียว ไม่ต้อง copy ข้อมูลเดิม
+    final["Linked RFI"] = keys.map(link_by_drawing).fillna("")
+    final["Is_Blocked"] = keys.isin(blocked_drawings)
+    return final
+
+
+def _finalize_drawing_frames(frames):
+    all_data = [f for f in frames if f is not None]
+    if not all_data: return pd.DataFrame(), {}
+    final = pd.concat(all_data, ignore_index=True)
+
+    for c in DRAWING_DATE_COLUMNS:
+        final[c] = _to_dates(final[c])
 
     final["Revision"] = final["Revision"].apply(
         lambda x: str(int(float(x))) if str(x).replace('.', '').isdigit() else "-")
 
-    return final.fillna("-"), "OK"
+    return _fill_text(final), {}
+
+
+# kind -> รวม DataFrame ทุก sheet (จาก bim_workers.parse_workbook) เป็น register
+_FRAME_FINALIZERS = {
+    "rfi": _finalize_rfi_frames,
+    "drawing": _finalize_drawing_frames,
+}
+# kind -> (คอลัมน์ category, คอลัมน์ key)
+_COMPACT_COLUMNS = {
+    "rfi": (RFI_CATEGORY_COLUMNS, "Doc Ref No."),
+    "drawing": (DRAWING_CATEGORY_COLUMNS, "RFAS Doc No."),
+}
+
+
+# ------------------------------------------------------------------
+# 🎨 STATUS CLASSIFICATION (คำนวณครั้งเดียวตอนโหลดข้อมูล)
+# ------------------------------------------------------------------
+def _category_matcher(series):
+    # contains บนค่าที่ไม่ซ้ำ (categories, ตัวพิมพ์เล็ก) แล้วกระจายกลับทุกแถวด้วย codes
+    # code -1 (NaN) ชี้ตัวท้าย "nan" -> ผลเท่ากับ astype(str).str.lower().str.contains(...)
+    cat = series.astype("category")
+    values = pd.Series([str(v) for v in cat.cat.categories] + ["nan"], dtype=object).str.lower()
+    codes = cat.cat.codes.to_numpy()
+    return lambda pattern, regex=True: values.str.contains(pattern, regex=regex).to_numpy(dtype=bool)[codes]
+
+
+def classify_drawings(df, today):
+    # เพิ่มคอลัมน์ Filter_Month, Is_Approved, Is_Overdue, Is_Code_C, Status_Color แบบ vectorized ทั้ง register
+    status_has = _category_matcher(df["Status"])
+    planned = df["Planned Submission"]
+    is_blocked = df["Is_Blocked"].astype(bool)
+
+    # 1. Approved/Closed: มีวันอนุมัติ หรือสถานะมี closed / a / b
+    is_approved = df["Approval Date"].notna() | status_has("closed|a|b")
+
+    # 2. Overdue: สถานะบอกว่าช้า หรือยังไม่ส่งและเลยวัน Planned แล้ว (NaT เทียบแล้วเป็น False เสมอ)
+    not_submitted = df["Submission Date"].isna()
+    is_overdue = (status_has("overdue|delayed|revise") |
+                  (not_submitted & (planned < pd.Timestamp(today))))
+
+    df = df.copy(deep=False)
+    df["Filter_Month"] = planned.dt.strftime('%Y-%m').where(planned.notna(), None)
+    df["Is_Approved"] = is_approved
+    df["Is_Overdue"] = is_overdue
+    # Code C (Revise & Resubmit): 'c' ในสถานะที่ไม่ใช่ 'closed' -> ใช้แค่ตอนลงสีตาราง
+    df["Is_Code_C"] = status_has("c", regex=False) & ~status_has("closed", regex=False)
+    df["Status_Color"] = np.select(
+        [is_approved, is_overdue & is_blocked, is_overdue, status_has("pending", regex=False)],
+        [COLOR_APPROVED, COLOR_OVERDUE_BLOCKED, COLOR_OVERDUE, COLOR_PENDING],
+        default=COLOR_NORMAL)
+    # class สำหรับลงสีตาราง (Code C มาก่อนสีอื่นทั้งหมด) -> ตอนแสดงผลแค่ map เป็น CSS ทีละหน้า
+    df["Style_Class"] = np.where(df["Is_Code_C"], "code_c",
+                                 df["Status_Color"].map(DRAWING_STYLE_CLASSES).fillna(""))
+    for c in ["Filter_Month", "Status_Color", "Style_Class"]:
+        df[c] = df[c].astype("category")
+    return df
+
+
+def classify_rfis(df):
+    # Action By: AUR/STT/CTA = กำลังดำเนินการ (มาก่อน CLOSED), CLOSED = ปิดแล้ว
+    action_has = _category_matcher(df["Action By"])
+    df = df.copy(deep=False)
+    df["Style_Class"] = pd.Categorical(np.select([action_has("aur|stt|cta"), action_has("closed", regex=False)],
+                                                 ["rfi_in_progress", "rfi_closed"], default=""))
+    return df
+
+
+DRAWING_METRICS = ["Total", "Submitted", "Approved", "Overdue / Blocked"]
+
+
+def drawing_metric_flags(df):
+    # 1 แถวต่อ drawing: นับเข้าการ์ดตัวไหนบ้าง (sum() = ตัวเลขบน Drawing tab, groupby = รายงานต่อ trade/เดือน)
+    return pd.DataFrame({
+        "Total": 1,
+        "Submitted": df['Submission Date'].notna(),
+        "Approved": df['Status_Color'] == COLOR_APPROVED,
+        "Overdue / Blocked": df['Status_Color'].isin([COLOR_OVERDUE_BLOCKED, COLOR_OVERDUE]),
+    }, index=df.index, columns=DRAWING_METRICS).astype(int)
+
+
+class DrawingCube:
+    # การ์ดตัวเลขรวมไว้ต่อ cell (Trade x Filter_Month x Status_Color) สร้างครั้งเดียวตอนโหลด register
+    # -> การ์ด/ตัวเลือก filter แต่ละ rerun = รวม cell ไม่กี่ร้อยแถว ไม่ขึ้นกับขนาด register
+    DIMENSIONS = ["Trade", "Filter_Month", "Status_Color"]
+
+    def __init__(self, df):
+        flags = drawing_metric_flags(df)
+        for col in self.DIMENSIONS:
+            flags[col] = df[col]
+        self.cells = flags.groupby(self.DIMENSIONS, dropna=False, sort=False, observed=True)[
+            DRAWING_METRICS].sum().reset_index()
+        # cube เล็ก -> filter ด้วย numpy ตรง ๆ เร็วกว่าผ่าน pandas หลายเท่า
+        self._dims = {col: self.cells[col].to_numpy(dtype=object) for col in self.DIMENSIONS}
+        self._values = self.cells[DRAWING_METRICS].to_numpy()
+
+    def trades(self):
+        return sorted([str(x) for x in self.cells['Trade'].unique() if str(x) not in ["nan", "-"]])
+
+    def months(self):
+        return sorted(self.cells['Filter_Month'].dropna().unique())
+
+    def totals(self, trade="ALL", months=None, colors=None):
+        # เงื่อนไขเดียวกับ filter ของ Drawing tab (ยกเว้น search ที่ต้องดูทีละแถว)
+        mask = np.ones(len(self._values), dtype=bool)
+        if trade != "ALL": mask &= self._dims['Trade'] == trade
+        if months: mask &= np.isin(self._dims['Filter_Month'], list(months))
+        if colors: mask &= np.isin(self._dims['Status_Color'], list(colors))
+        return pd.Series(self._values[mask].sum(axis=0), index=DRAWING_METRICS)
+
+
+# ------------------------------------------------------------------
+# 🔎 SEARCH INDEX (inverted index สร้างครั้งเดียวตอนโหลด register)
+# ------------------------------------------------------------------
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+_PUNCT_PATTERN = re.compile(r"[^\w\s]|_")
+
+
+def search_tokens(text):
+    # คำ (ตัวอักษร/ตัวเลข) + ชิ้นที่มีเครื่องหมายอย่างเลขเอกสารพร้อม suffix ทุกช่วง
+    # "523213-01-RFAS-AR-0012" -> 523213, 01, rfas, ar, 0012, 523213-01-rfas-ar-0012, 01-rfas-ar-0012, ..., ar-0012
+    text = str(text).lower()
+    tokens = set(_WORD_PATTERN.findall(text))
+    for chunk in text.split():
+        chunk = chunk.strip(".,;:()[]")
+        if not _PUNCT_PATTERN.search(chunk): continue
+        tokens.add(chunk)
+        for m in _PUNCT_PATTERN.finditer(chunk):
+            if chunk[m.end():]: tokens.add(chunk[m.end():])
+    return tokens
+
+
+class SearchIndex:
+    # token -> ตำแหน่งแถว (np.array เรียงแล้ว); ค้นแบบ prefix ทุกคำ แล้ว AND กัน
+    def __init__(self, df, columns):
+        self.index = df.index
+        postings = {}
+        for col in columns:
+            if col not in df.columns: continue
+            # tokenize ค่าที่ไม่ซ้ำครั้งเดียว (description/trade ซ้ำกันเยอะ) แล้วกระจายไปทุกแถวที่มีค่านั้น
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=True)
+            rows_by_code = pd.Series(np.arange(len(codes))).groupby(codes).indices
+            for code, text in enumerate(uniques):
+                rows = rows_by_code.get(code)
+                if rows is None: continue
+                for token in search_tokens(text):
+                    postings.setdefault(token, []).append(rows)
+        # token เดียวกันจากหลายคอลัมน์ -> รวมแล้วเรียงใหม่
+        self._postings = {t: p[0] if len(p) == 1 else np.unique(np.concatenate(p)) for t, p in postings.items()}
+        self._vocab = sorted(self._postings)
+
+    def _prefix_positions(self, term):
+        i = bisect.bisect_left(self._vocab, term)
+        hits = []
+        while i < len(self._vocab) and self._vocab[i].startswith(term):
+            hits.append(self._postings[self._vocab[i]])
+            i += 1
+        if not hits: return np.empty(0, dtype=np.int64)
+        return hits[0] if len(hits) == 1 else np.unique(np.concatenate(hits))
+
+    def search(self, query):
+        # คืน index label ของแถวที่ตรงทุกคำ -> ใช้ร่วมกับ filter อื่นด้วย df.index.isin(...)
+        terms = [t.strip(".,;:()[]") for t in str(query).lower().split()]
+        positions = None
+        for term in filter(None, terms):
+            hits = self._prefix_positions(term)
+            positions = hits if positions is None else np.intersect1d(positions, hits, assume_unique=True)
+            if not len(positions): break
+        if positions is None: return self.index
+        return self.index[positions]
+
+
+DRAWING_SEARCH_COLUMNS = ["Document Description", "RFAS Doc No.", "Trade"]
+RFI_SEARCH_COLUMNS = ["Document Description", "Doc Ref No."]
+
+
+# ------------------------------------------------------------------
+# 📊 BATCH REPORTS (python WPS.py report -> สรุปทุกโปรเจกต์เป็น CSV/XLSX/JSON โดยไม่ต้องเปิดเว็บ)
+# ------------------------------------------------------------------
+REPORT_FORMATS = ["csv", "xlsx", "json"]
+REPORT_LIST_COLUMNS = ["Trade", "RFAS Doc No.", "Document Description", "Planned Submission", "Submission Date",
+                       "Status", "Action", "Linked RFI", "Status_Color"]
+
+
+def load_project_registers(project, today, pool=None):
+    # ขั้นตอนเดียวกับ load_drawing_excel แต่ไม่แตะ singleton ของ Streamlit (ยังใช้ snapshot บนดิสก์)
+    snapshots = load_workbook_snapshots(project.sources(), project.cache_folder, project.sheet_mapping,
+                                        Metrics(False), pool)
+    df_rfi, rfi_map = _rfi_result(snapshots)
+    df_drawing, msg = _drawing_result(snapshots, rfi_map, build_rfi_link_table(read_project_links(project)))
+    if not df_drawing.empty: df_drawing = classify_drawings(df_drawing, today)
+    return df_drawing, df_rfi, msg
+
+
+def _summarize(flags, by):
+    summary = flags.groupby(by, sort=True, observed=True)[DRAWING_METRICS].sum()
+    summary["Submitted %"] = (summary["Submitted"] / summary["Total"] * 100).round(1)
+    return summary.reset_index()
+
+
+def build_project_report(project, today, pool=None):
+    # {ชื่อตาราง: DataFrame} ของ 1 โปรเจกต์ (ทุกตารางมีคอลัมน์ Project นำหน้า)
+    t0 = time.perf_counter()
+    df, df_rfi, msg = load_project_registers(project, today, pool)
+    tables = {}
+    if not df.empty:
+        flags = drawing_metric_flags(df)
+        flags["Trade"] = df["Trade"]
+        flags["Month"] = df["Filter_Month"].astype(object).fillna("-")
+        tables["totals"] = flags[DRAWING_METRICS].sum().to_frame().T.assign(
+            **{"RFIs": len(df_rfi), "Blocked": int(df["Is_Blocked"].sum())})
+        tables["by_trade"] = _summarize(flags, "Trade")
+        tables["by_month"] = _summarize(flags, "Month")
+        tables["overdue"] = df.loc[flags["Overdue / Blocked"] == 1, REPORT_LIST_COLUMNS]
+        tables["blocked"] = df.loc[df["Is_Blocked"], REPORT_LIST_COLUMNS]
+    tables = {name: t.reset_index(drop=True).assign(Project=project.key)[["Project"] + list(t.columns)]
+              for name, t in tables.items()}
+    return tables, msg, time.perf_counter() - t0
+
+
+def write_reports(reports, out_dir, formats, today):
+    # reports: {project key: tables} -> ไฟล์รวมทุกโปรเจกต์ (1 ไฟล์ต่อตารางสำหรับ CSV)
+    os.makedirs(out_dir, exist_ok=True)
+    names = ["totals", "by_trade", "by_month", "overdue", "blocked"]
+    combined = {name: pd.concat([tables[name] for tables in reports.values() if name in tables], ignore_index=True)
+                if any(name in tables for tables in reports.values()) else pd.DataFrame() for name in names}
+    written = []
+    if "csv" in formats:
+        for name, table in combined.items():
+            written.append(os.path.join(out_dir, f"{name}.csv"))
+            table.to_csv(written[-1], index=False, encoding="utf-8-sig")  # BOM -> Excel เปิดภาษาไทยได้
+    if "xlsx" in formats:
+        written.append(os.path.join(out_dir, "report.xlsx"))
+        with pd.ExcelWriter(written[-1], engine="openpyxl") as writer:
+            for name, table in combined.items():
+                table.to_excel(writer, sheet_name=name, index=False)
+    if "json" in formats:
+        written.append(os.path.join(out_dir, "report.json"))
+        # to_json: วันที่ -> ISO, NaT -> null
+        payload = {"date": today.isoformat(), "generated": datetime.now().isoformat(timespec="seconds"),
+                   "projects": {key: {name: json.loads(t.drop(columns="Project").to_json(orient="records",
+                                                                                         date_format="iso"))
+                                      for name, t in tables.items()}
+                                for key, tables in reports.items()}}
+        with open(written[-1], "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+    return written
+
+
+def run_reports(argv):
+    parser = argparse.ArgumentParser(prog="python WPS.py report", description="สรุป Drawing/RFI ทุกโปรเจกต์")
+    parser.add_argument("--projects", nargs="+", help="key ใน bim_projects.json (default = ทุกโปรเจกต์)")
+    parser.add_argument("--out", default=os.path.join(DATA_FOLDER, "reports"))
+    parser.add_argument("--format", nargs="+", choices=REPORT_FORMATS, default=REPORT_FORMATS)
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(), help="วันที่ใช้ตัดสิน overdue")
+    args = parser.parse_args(argv)
+
+    projects = load_projects()
+    unknown = set(args.projects or []) - set(projects)
+    if unknown: parser.error(f"unknown project(s): {', '.join(sorted(unknown))}")
+    selected = [projects[key] for key in args.projects or projects]
+    if not selected:
+        print("no projects to report")
+        return 0
+
+    # thread ต่อโปรเจกต์: อ่าน parquet/คำนวณแบบ vectorized ส่วนใหญ่ปล่อย GIL
+    # parse Excel (snapshot ยังไม่มี/เก่า) ส่งเข้า process pool เดียวกันทุกโปรเจกต์ -> ไม่ต่อคิว GIL ใน process นี้
+    # worker ถูกสร้างเมื่อมีงานเท่านั้น: snapshot ครบทุกโปรเจกต์ก็ไม่ start process
+    reports, failed = {}, 0
+    with ProcessPoolExecutor(max_workers=max(1, INGEST_WORKERS), mp_context=worker_context()) as parse_pool, \
+            ThreadPoolExecutor(max_workers=len(selected)) as pool:
+        futures = {pool.submit(build_project_report, p, args.date, parse_pool): p for p in selected}
+        for future in as_completed(futures):
+            project = futures[future]
+            try:
+                tables, msg, seconds = future.result()
+            except Exception as e:
+                log.error("report %s failed: %s", project.key, e)
+                failed += 1
+                continue
+            reports[project.key] = tables
+            print(f"{project.key:<20} {msg:<15} {seconds:6.2f}s")
+
+    out_dir = os.path.join(args.out, args.date.isoformat())
+    for path in write_reports({p.key: reports[p.key] for p in selected if p.key in reports}, out_dir, args.format,
+                              args.date):
+        print(f"-> {path}")
+    return 1 if failed else 0
 
 
 # ------------------------------------------------------------------
 # 📂 PDF HANDLING FOR CLOUD (MODIFIED)
 # ------------------------------------------------------------------
-def open_pdf(doc_no):
+# เลขเอกสารแบบ 523213-01-RFI-AR-0003 (ชื่อไฟล์ต่อท้ายด้วยชื่อเรื่อง/revision/_CTA_SLA_STT ได้)
+DOC_REF_PATTERN = re.compile(r"\d+-\d+-[A-Z]+-[A-Z]+-\d+", re.IGNORECASE)
+# revision ในชื่อไฟล์: R0_CTA, _R1_, DiscontinuedR0_CTA
+REVISION_PATTERN = re.compile(r"R(\d+)(?=[_\s.]|$)")
+
+
+def normalize_doc_ref(text):
+    text = str(text).strip()
+    m = DOC_REF_PATTERN.search(text)
+    return m.group(0).upper() if m else text.upper()
+
+
+class DocumentIndex:
+    # doc ref -> ทุก revision ของไฟล์ PDF ในโฟลเดอร์ (ล่าสุดก่อน)
+    # refresh() ดู mtime ของโฟลเดอร์ก่อน -> ไม่มีไฟล์เพิ่ม/ลบ ก็ไม่ต้อง listdir
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._dir_version = None
+        self._files = {}  # ชื่อไฟล์ -> (ref, revision, mtime)
+        self._refs = {}
+
+    def refresh(self):
+        try:
+            dir_version = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            dir_version = None
+        if dir_version == self._dir_version: return
+
+        with self._lock:
+            if dir_version == self._dir_version: return
+            files = {}
+            if dir_version is not None:
+                for entry in os.scandir(self.folder):
+                    if not entry.name.lower().endswith(".pdf") or not entry.is_file(): continue
+                    # parse เฉพาะไฟล์ใหม่ ไฟล์เดิมใช้ค่าที่มีอยู่
+                    files[entry.name] = self._files.get(entry.name) or self._parse_name(entry)
+
+            refs = {}
+            for name, (ref, revision, mtime) in files.items():
+                refs.setdefault(ref, []).append((revision, mtime, os.path.join(self.folder, name)))
+            for revisions in refs.values():
+                revisions.sort(reverse=True)
+
+            self._files, self._refs, self._dir_version = files, refs, dir_version
+
+    @staticmethod
+    def _parse_name(entry):
+        stem = os.path.splitext(entry.name)[0]
+        ref = normalize_doc_ref(stem)
+        revisions = REVISION_PATTERN.findall(stem[len(ref):])
+        return ref, int(revisions[-1]) if revisions else 0, entry.stat().st_mtime_ns
+
+    def revisions(self, doc_no):
+        self.refresh()
+        return [path for _, _, path in self._refs.get(normalize_doc_ref(doc_no), [])]
+
+    def lookup(self, doc_no):
+        revisions = self.revisions(doc_no)
+        return revisions[0] if revisions else None
+
+    def missing(self, doc_refs):
+        # RFI ใน register ที่ยังไม่มีไฟล์ PDF เลย
+        self.refresh()
+        return [r for r in doc_refs if normalize_doc_ref(r) not in self._refs]
+
+
+@st.cache_resource
+def get_document_index(key=DEFAULT_PROJECT):
+    return DocumentIndex(get_project(key).pdf_folder)
+
+
+class PdfByteCache:
+    # LRU ตามจำนวน byte (ไม่ใช่จำนวนไฟล์): path -> ((size, mtime), bytes)
+    # ไฟล์ถูกแก้ (size/mtime เปลี่ยน) -> อ่านใหม่
+    def __init__(self, max_bytes, uncached_threshold, metrics=None):
+        self.metrics = metrics or Metrics(False)
+        self.max_bytes = max_bytes
+        self.uncached_threshold = uncached_threshold
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def read(self, file_path):
+        version = file_version(file_path)
+        if version is None: raise FileNotFoundError(file_path)
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(file_path)
+                self.metrics.cache("pdf", True)
+                return entry[1]
+
+        self.metrics.cache("pdf", False)
+        self.metrics.io("pdf", "read", version[0])
+        with open(file_path, "rb") as f:
+            data = f.read()
+        if len(data) >= self.uncached_threshold:
+            # ไฟล์สแกนขนาดใหญ่: ส่งแล้วทิ้ง ไม่ไล่ไฟล์อื่นออกจาก cache
+            # (download_button แปลง data เป็น bytes ทั้งก้อนอยู่ดี mmap/stream จึงไม่ช่วยลด memory)
+            return data
+        with self._lock:
+            old = self._entries.pop(file_path, None)
+            if old is not None: self._bytes -= len(old[1])
+            self._entries[file_path] = (version, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return data
+
+
+@st.cache_resource
+def get_pdf_cache():
+    return PdfByteCache(PDF_CACHE_BYTES, PDF_UNCACHED_THRESHOLD, get_metrics())
+
+
+def open_pdf(doc_no, project=None):
+    project = project or get_project()
     # ตรวจสอบว่ามีโฟลเดอร์ RFI หรือไม่
-    if not os.path.exists(RFI_FOLDER):
-        st.error(f"Folder not found in Repo: {RFI_FOLDER}")
+    if not os.path.exists(project.pdf_folder):
+        st.error(f"Folder not found in Repo: {project.pdf_folder}")
         return
 
     # ค้นหาไฟล์ PDF
-    target_file = None
     try:
-        files = os.listdir(RFI_FOLDER)
-        for f in files:
-            if f.lower().startswith(str(doc_no).lower()) and f.lower().endswith(".pdf"):
-                target_file = os.path.join(RFI_FOLDER, f)
-                break
+        revisions = get_document_index(project.key).revisions(doc_no)
+        target_file = revisions[0] if revisions else None
 
         if target_file:
             # บน Cloud เราใช้ st.download_button หรือแสดง PDF Embed แทน os.startfile
-            with open(target_file, "rb") as pdf_file:
-                PDFbyte = pdf_file.read()
-
             st.markdown(f"**Found:** `{os.path.basename(target_file)}`")
+            if len(revisions) > 1:
+                st.caption("Older revisions: " + ", ".join(f"`{os.path.basename(p)}`" for p in revisions[1:]))
 
-            # ปุ่ม Download
+            # ปุ่ม Download: ส่ง callable -> อ่านไฟล์ตอนผู้ใช้กดดาวน์โหลดจริงเท่านั้น (ผ่าน cache ของ process)
+            pdf_cache = get_pdf_cache()
             st.download_button(label="⬇️ Download PDF",
-                               data=PDFbyte,
+                               data=lambda: pdf_cache.read(target_file),
                                file_name=os.path.basename(target_file),
                                mime='application/octet-stream')
 
             # (Optional) แสดง Preview ในเว็บเลย
-            # base64_pdf = base64.b64encode(PDFbyte).decode('utf-8')
+            # base64_pdf = base64.b64encode(pdf_cache.read(target_file)).decode('utf-8')
             # pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="600" type="application/pdf"></iframe>'
             # st.markdown(pdf_display, unsafe_allow_html=True)
 
@@ -351,12 +1946,200 @@ def open_pdf(doc_no):
 
 
 # ------------------------------------------------------------------
+# 📄 PDF FULL-TEXT INDEX (แยกข้อความใน process pool เบื้องหลัง -> SQLite FTS5)
+# ------------------------------------------------------------------
+class PdfTextIndex:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pdf_files (name TEXT PRIMARY KEY, doc_ref TEXT, size INTEGER, mtime_ns INTEGER,
+                                              error TEXT);
+        CREATE VIRTUAL TABLE IF NOT EXISTS pdf_text USING fts5(
+            doc_ref UNINDEXED, name UNINDEXED, body, tokenize = 'porter unicode61');
+    """
+
+    def __init__(self, db_path, folder):
+        self.db_path = db_path
+        self.folder = folder
+        self._pool = SqlitePool(db_path, ["PRAGMA busy_timeout=10000"])
+        self._running = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._pool.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+
+    def _pending(self):
+        # ไฟล์ใหม่/ถูกแทนที่ (size หรือ mtime เปลี่ยน) และไฟล์ที่ถูกลบ
+        with self._pool.connection() as conn:
+            indexed = {name: (size, mtime) for name, size, mtime in
+                       conn.execute("SELECT name, size, mtime_ns FROM pdf_files")}
+        current = {}
+        if os.path.isdir(self.folder):
+            for entry in os.scandir(self.folder):
+                if entry.name.lower().endswith(".pdf") and entry.is_file():
+                    stat = entry.stat()
+                    current[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        changed = [name for name, version in current.items() if indexed.get(name) != version]
+        removed = [name for name in indexed if name not in current]
+        return current, changed, removed
+
+    def _store(self, name, version, text, error):
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM pdf_text WHERE name = ?", (name,))
+                conn.execute("INSERT INTO pdf_text (doc_ref, name, body) VALUES (?, ?, ?)",
+                             (normalize_doc_ref(os.path.splitext(name)[0]), name, text))
+                conn.execute("INSERT OR REPLACE INTO pdf_files VALUES (?, ?, ?, ?, ?)",
+                             (name, normalize_doc_ref(os.path.splitext(name)[0]), version[0], version[1], error))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def sync(self):
+        # re-index เฉพาะไฟล์ที่เปลี่ยน; บันทึกทีละไฟล์ที่เสร็จ -> หยุดกลางทางก็ไม่ต้องเริ่มใหม่ทั้งหมด
+        if pypdf is None or not self._running.acquire(blocking=False): return 0
+        try:
+            current, changed, removed = self._pending()
+            with self._pool.connection() as conn:
+                for name in removed:
+                    conn.execute("DELETE FROM pdf_text WHERE name = ?", (name,))
+                    conn.execute("DELETE FROM pdf_files WHERE name = ?", (name,))
+            if not changed: return 0
+
+            paths = {name: os.path.join(self.folder, name) for name in changed}
+            done = set()
+            # แยกข้อความใน process เสมอ (แม้ไฟล์เดียว/CPU เดียว): pypdf ใน thread ของ server แย่ GIL กับ request ของผู้ใช้
+            try:
+                with ProcessPoolExecutor(max_workers=max(1, min(INGEST_WORKERS, len(changed))),
+                                         mp_context=worker_context()) as pool:
+                    futures = {pool.submit(bim_workers.extract_pdf_text, paths[name]): name for name in changed}
+                    for future in as_completed(futures):
+                        name = futures[future]
+                        self._store(name, current[name], *future.result())
+                        done.add(name)
+            except Exception:
+                # pool ใช้ไม่ได้ (worker ตาย/สร้าง process ไม่ได้) -> แยกไฟล์ที่เหลือใน thread นี้ ไม่ปล่อยให้ตกหล่น
+                log.warning("pdf text pool failed, extracting %d file(s) in-thread",
+                            len(changed) - len(done), exc_info=True)
+            for name in changed:
+                if name not in done:
+                    self._store(name, current[name], *bim_workers.extract_pdf_text(paths[name]))
+            log.info("pdf text index: %d file(s) indexed", len(changed))
+            return len(changed)
+        finally:
+            self._running.release()
+
+    def sync_in_background(self):
+        # เรียกจาก scheduler: แยก thread ไม่ให้การแยกข้อความ PDF ไปถ่วงงานอื่น (presence flush ฯลฯ)
+        if self._running.locked(): return
+        threading.Thread(target=self._sync_logged, name="bim-pdf-index", daemon=True).start()
+
+    def _sync_logged(self):
+        try:
+            self.sync()
+        except Exception:
+            log.exception("pdf text index failed")
+
+    def status(self):
+        with self._pool.connection() as conn:
+            indexed, failed = conn.execute("SELECT COUNT(*), COUNT(error) FROM pdf_files").fetchone()
+        return {"indexed": indexed, "failed": failed, "running": self._running.locked()}
+
+    def search(self, query, limit=50):
+        # ทุกคำเป็น prefix และต้องมีครบ (AND); คืน Doc Ref No. + ข้อความบางส่วนรอบคำที่เจอ
+        # snippet ไม่ใส่ตัวเน้น: แสดงใน st.dataframe ซึ่งไม่ render markdown (** จะโผล่เป็นตัวอักษร)
+        terms = ['"' + t.replace('"', '""') + '"*' for t in str(query).split()]
+        if not terms: return pd.DataFrame(columns=["Doc Ref No.", "File", "Snippet"])
+        with self._pool.connection() as conn:
+            hits = pd.read_sql_query(
+                "SELECT doc_ref AS \"Doc Ref No.\", name AS File, "
+                "snippet(pdf_text, 2, '', '', ' … ', 16) AS Snippet "
+                "FROM pdf_text WHERE pdf_text MATCH ? ORDER BY bm25(pdf_text) LIMIT ?",
+                conn, params=(" ".join(terms), limit))
+        hits["Snippet"] = hits["Snippet"].str.replace(r"\s+", " ", regex=True)  # ขึ้นบรรทัดใหม่ของ PDF -> ช่องว่าง
+        return hits
+
+
+@st.cache_resource
+def get_pdf_text_index(key=DEFAULT_PROJECT):
+    # เริ่ม index เบื้องหลังเมื่อมีคนเปิดโปรเจกต์นั้นครั้งแรก (โปรเจกต์ที่ไม่มีใครเปิดไม่ต้อง index)
+    project = get_project(key)
+    index = PdfTextIndex(os.path.join(project.cache_folder, PDF_TEXT_DB_NAME), project.pdf_folder)
+    get_scheduler().every(f"pdf-text-index.{project.key}", PDF_INDEX_SECONDS, index.sync_in_background, delay=0)
+    return index
+
+
+# ------------------------------------------------------------------
+
+AVATAR_THUMB_SIZE = (64, 64)  # ใน member panel แสดงแค่ 32px
+
+
+class AvatarCache:
+    # username -> (mtime, base64 รูปเต็ม, base64 thumbnail) encode ครั้งเดียวต่อไฟล์
+    # rerun ปกติ stat แค่โฟลเดอร์ 1 ครั้ง; อัพโหลดผ่านแอปเรียก invalidate() เอง
+    # (เขียนทับไฟล์เดิม mtime ของโฟลเดอร์ไม่เปลี่ยน)
+    def __init__(self, folder, metrics=None):
+        self.metrics = metrics or Metrics(False)
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._dir_version = None
+        self._avatars = {}
+
+    def _refresh(self):
+        try:
+            dir_version = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            dir_version = None
+        if dir_version == self._dir_version: return
+
+        with self._lock:
+            if dir_version == self._dir_version: return
+            avatars = {}
+            if dir_version is not None:
+                for entry in os.scandir(self.folder):
+                    if not entry.name.endswith(".png"): continue
+                    username, mtime = entry.name[:-4], entry.stat().st_mtime_ns
+                    cached = self._avatars.get(username)
+                    if cached is None or cached[0] != mtime:
+                        self.metrics.io("avatar", "read", entry.stat().st_size)
+                        cached = self._encode(entry.path, mtime)
+                    avatars[username] = cached
+            self._avatars, self._dir_version = avatars, dir_version
+
+    @staticmethod
+    def _encode(file_path, mtime):
+        with open(file_path, "rb") as f: raw = f.read()
+        thumb = io.BytesIO()
+        try:
+            image = Image.open(io.BytesIO(raw))
+            image.thumbnail(AVATAR_THUMB_SIZE)
+            image.save(thumb, "PNG")
+        except Exception:
+            thumb = io.BytesIO(raw)
+        return mtime, base64.b64encode(raw).decode(), base64.b64encode(thumb.getvalue()).decode()
+
+    def invalidate(self):
+        with self._lock:
+            self._dir_version = None
+
+    def image(self, username):
+        self._refresh()
+        entry = self._avatars.get(username)
+        return entry[1] if entry else None
+
+    def thumbnail(self, username):
+        self._refresh()
+        entry = self._avatars.get(username)
+        return entry[2] if entry else None
+
+
+@st.cache_resource
+def get_avatar_cache():
+    return AvatarCache(IMG_FOLDER, get_metrics())
+
 
 def get_image_base64(username):
-    file_path = os.path.join(IMG_FOLDER, f"{username}.png")
-    if os.path.exists(file_path):
-        with open(file_path, "rb") as f: return base64.b64encode(f.read()).decode()
-    return None
+    return get_avatar_cache().image(username)
 
 
 def save_uploaded_image(uploaded_file, username):
@@ -365,111 +2148,66 @@ def save_uploaded_image(uploaded_file, username):
         image = image.resize((150, 150))
         file_path = os.path.join(IMG_FOLDER, f"{username}.png")
         image.save(file_path, "PNG")
+        get_avatar_cache().invalidate()
+        get_signals().bump("presence")  # รูปในแถบสมาชิก
         return True
     except:
         return False
 
 
-def update_heartbeat(username):
-    df = load_data(STATUS_FILE)
-
-    # ป้องกันไฟล์ว่าง
-    if df.empty or 'Name' not in df.columns:
-        df = pd.DataFrame(
-            columns=["Name", "Current_File", "Level", "Task_Detail", "Last_Updated", "Last_Seen", "Status"])
-
-    idx = df.index[df['Name'] == username].tolist()
-
+def thai_now():
     # 🟢 คำนวณเวลาไทย (UTC + 7 ชั่วโมง)
-    thai_now = datetime.utcnow() + timedelta(hours=7)
+    return datetime.utcnow() + timedelta(hours=7)
 
-    timestamp = thai_now.strftime("%Y-%m-%d %H:%M:%S")  # เวลาเต็ม
-    time_short = thai_now.strftime("%d/%m %H:%M")  # วันที่ย่อ + เวลา
 
-    if idx:
-        i = idx[0]
-        df.at[i, 'Last_Seen'] = timestamp
-        df.at[i, 'Last_Updated'] = time_short  # อัพเดทเวลาโชว์ด้วย
+def update_heartbeat(username):
+    now = thai_now()
 
-        # ถ้าสถานะเดิมเป็น Offline/ว่าง -> เปลี่ยนเป็น Online
-        current_stat = str(df.at[i, 'Status'])
-        if "Offline" in current_stat or current_stat == "nan" or current_stat == "":
-            df.at[i, 'Status'] = "Online"
-    else:
-        # User ใหม่
-        new_row = pd.DataFrame([{
-            "Name": username,
-            "Current_File": "Idle",
-            "Level": "-",
-            "Task_Detail": "-",
-            "Last_Updated": time_short,
-            "Last_Seen": timestamp,
-            "Status": "Online"
-        }])
-        df = pd.concat([df, new_row], ignore_index=True)
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")  # เวลาเต็ม
+    time_short = now.strftime("%d/%m %H:%M")  # วันที่ย่อ + เวลา
 
-    save_data(df, STATUS_FILE)
+    get_presence().heartbeat(username, timestamp, time_short)
 
 
-def check_auto_offline():
-    df = load_data(STATUS_FILE)
-    if df.empty: return
+def sweep_offline(presence, now):
+    # ตรวจทุกคนพร้อมกันแบบ vectorized: ยังไม่ Offline และ Last_Seen เก่ากว่า OFFLINE_TIMEOUT_MINUTES -> Offline
+    df = presence.frame()
+    if df.empty: return []
 
-    # 🟢 ใช้เวลาไทย (UTC + 7) ในการตรวจสอบ
-    thai_now = datetime.utcnow() + timedelta(hours=7)
+    last_seen = pd.to_datetime(df['Last_Seen'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+    expired = (~df['Status'].astype(str).str.contains("Offline", regex=False) & last_seen.notna() &
+               ((now - last_seen) > pd.Timedelta(minutes=OFFLINE_TIMEOUT_MINUTES)))
 
-    changed = False
-    for i, row in df.iterrows():
-        try:
-            last_seen_str = str(row['Last_Seen'])
-            status = str(row['Status'])
+    # เขียนเฉพาะแถวที่เปลี่ยน
+    seen = dict(zip(df.loc[expired, 'Name'], df.loc[expired, 'Last_Seen']))
+    if seen:
+        presence.mark_offline(seen)
+    return list(seen)
 
-            # ข้ามคน Offline อยู่แล้ว
-            if "Offline" in status: continue
-            if last_seen_str == "nan" or last_seen_str == "": continue
 
-            # คำนวณความต่างเวลา
-            last_seen = datetime.strptime(last_seen_str, "%Y-%m-%d %H:%M:%S")
-            diff = (thai_now - last_seen).total_seconds() / 60
+def send_private_message(from_user, to_user, message):
+    get_store().append_private_message({"Timestamp": datetime.now().strftime("%H:%M"), "From_User": from_user,
+                                        "To_User": to_user, "Message": message})
+    get_signals().bump(("chat", to_user))
 
-            # ถ้าหายไปนานกว่ากำหนด (เช่น 5 นาที) -> Offline
-            if diff > OFFLINE_TIMEOUT_MINUTES:
-                df.at[i, 'Status'] = "⚫ Offline"
-                df.at[i, 'Current_File'] = "Idle"
-                changed = True
-        except:
-            pass
 
-    if changed:
-        save_data(df, STATUS_FILE)
+def get_my_messages(my_username):
+    return get_store().read_private_messages(my_username)
 
 
-def send_private_message(from_user, to_user, message):
-    df = load_data(PRIVATE_CHAT_FILE)
-    new_msg = pd.DataFrame([{"Timestamp": datetime.now().strftime("%H:%M"), "From_User": from_user, "To_User": to_user,
-                             "Message": message}])
-    df = pd.concat([df, new_msg], ignore_index=True)
-    save_data(df, PRIVATE_CHAT_FILE)
+def group_recipients(presence_df, group):
+    # คนที่เปิดไฟล์ group อยู่ (ชื่อไฟล์ใน FILE_LIST) หรือไฟล์ใดก็ได้ของ trade group (เช่น "ME" = ME-HVAC, ME-Sanitary)
+    files = presence_df['Current_File'].astype(str).str.split("|").explode()
+    match = (files == group) | files.str.startswith(group + "-")
+    return sorted(presence_df.loc[match[match].index.unique(), 'Name'])
 
 
-def send_notification(to_user, from_user, msg_type):
-    df = load_data(NOTIFY_FILE)
-    new_notif = pd.DataFrame(
-        [{"To_User": to_user, "From_User": from_user, "Type": msg_type, "Message": f"Action: {msg_type}",
-          "Timestamp": datetime.now().strftime("%H:%M")}])
-    df = pd.concat([df, new_notif], ignore_index=True)
-    save_data(df, NOTIFY_FILE)
+def send_group_notification(from_user, recipients, msg_type, group):
+    return get_broadcasts().send(from_user, recipients, msg_type, group)
 
 
 def get_my_notifications(my_username):
-    df = load_data(NOTIFY_FILE)
-    if df.empty: return []
-    my_notifs = df[df['To_User'] == my_username]
-    if not my_notifs.empty:
-        df = df[df['To_User'] != my_username]
-        save_data(df, NOTIFY_FILE)
-        return my_notifs.to_dict('records')
-    return []
+    return get_store().read_notifications(my_username)
 
 
 def highlight_online_status(row):
@@ -479,76 +2217,203 @@ def highlight_online_status(row):
     return [''] * len(row)
 
 
-def highlight_drawing(row):
-    style = [''] * len(row)
-    try:
-        status = str(row.get('Status', '')).lower()
-        approve = str(row.get('Approval Date', ''))
-        planned = str(row.get('Planned Submission', ''))
-        submit = str(row.get('Submission Date', ''))
-        is_blocked = row.get('Is_Blocked', False)
-
-        # 🟢🔴 0. Special Logic: Code C (Green BG / Red Text)
-        # เช็คว่ามี 'c' อยู่ในสถานะ แต่ต้องไม่ใช่คำว่า 'closed' (เพราะ closed ก็มีตัว c)
-        # และต้องระวังไม่ให้ไปจับคำว่า 'blocked' หรือ 'reject' ถ้าคุณไม่ได้ตั้งใจ
-        # แต่นี่คือ Logic ตามที่ขอ: ถ้าเจอ c ให้พื้นเขียว ตัวแดง
-        if "c" in status and "closed" not in status:
-            return ['background-color: #d4edda; color: #dc3545; font-weight: bold'] * len(row)
-
-        # 🟢 1. Green: Approved/Closed
-        is_approved = False
-        if approve != "-" and approve != "": is_approved = True
-        if any(x in status for x in ["closed", "a", "b"]): is_approved = True
-
-        if is_approved:
-            return ['background-color: #d4edda; color: #155724'] * len(row)
-
-        # 🟣 2. Purple: Overdue & Blocked by RFI
-        is_overdue = False
-        if "overdue" in status or "delayed" in status or "revise" in status: is_overdue = True
-        if (submit == "-" or submit == "") and (planned != "-" and planned != ""):
-            try:
-                if datetime.strptime(planned, '%d %b %Y').date() < date.today(): is_overdue = True
-            except:
-                pass
+# Style_Class (คำนวณไว้ตอนโหลดใน classify_drawings / classify_rfis) -> CSS ของทั้งแถว
+ROW_STYLES = {
+    "approved": 'background-color: #d4edda; color: #155724',
+    "overdue_blocked": 'background-color: #e2d9f3; color: #5a3791; font-weight: bold',
+    "overdue": 'background-color: #f8d7da; color: #721c24; font-weight: bold',
+    "pending": 'background-color: #fff3cd; color: #856404; font-weight: bold',
+    # 🟢🔴 Code C: พื้นเขียว ตัวแดง
+    "code_c": 'background-color: #d4edda; color: #dc3545; font-weight: bold',
+    "rfi_in_progress": 'background-color: #fff3cd; color: #856404',
+    "rfi_closed": 'background-color: #d4edda; color: #155724',
+}
+TABLE_PAGE_SIZE = 100
+
+
+def drawing_filter_mask(df, trade, months, colors, search_index=None, query=""):
+    # filter ของ Drawing tab เป็น boolean mask เดียว (ไม่สร้าง frame กลางทางทีละขั้น)
+    mask = np.ones(len(df), dtype=bool)
+    if trade != "ALL": mask &= (df['Trade'] == trade).to_numpy()
+    if months: mask &= df['Filter_Month'].isin(months).to_numpy()
+    if colors: mask &= df['Status_Color'].isin(colors).to_numpy()
+    if query: mask &= df.index.isin(search_index.search(query))
+    return mask
+
+
+def paged_table(df, key, column_order, height=600):
+    # แสดงทีละหน้า: ลงสีและส่งไป browser เฉพาะแถวในหน้านั้น
+    # คืนแถวที่เลือก (Series จาก df เดิม, .name = index เดิม) หรือ None
+    n_pages = max(1, -(-len(df) // TABLE_PAGE_SIZE))
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > n_pages: st.session_state[page_key] = 1  # filter แล้วหน้าน้อยลง
+    page = st.number_input(f"Page (1-{n_pages})", min_value=1, max_value=n_pages, key=page_key) if n_pages > 1 else 1
+
+    page_df = df.iloc[(page - 1) * TABLE_PAGE_SIZE:page * TABLE_PAGE_SIZE]
+    with get_metrics().span(f"{key}.style"):
+        view = page_df[[c for c in column_order if c in page_df.columns]]
+        css = page_df["Style_Class"].astype(str).map(ROW_STYLES).fillna("").to_numpy()
+        styled = view.style.apply(lambda v: np.repeat(css[:, None], v.shape[1], axis=1), axis=None)
+        # วันที่เก็บเป็น datetime64 -> แปลงเป็นข้อความเฉพาะแถวในหน้านี้
+        date_cols = [c for c in view.columns if pd.api.types.is_datetime64_any_dtype(view[c])]
+        if date_cols: styled = styled.format(lambda v: v.strftime(DATE_FORMAT), subset=date_cols, na_rep="-")
+
+    # key ผูกกับแถวในหน้า -> เปลี่ยนหน้า/filter แล้ว selection เดิมไม่ชี้ไปแถวอื่น
+    with get_metrics().span(f"{key}.render"):
+        event = st.dataframe(styled, use_container_width=True, height=height, hide_index=True, on_select="rerun",
+                             selection_mode="single-row", key=f"{key}_{page}_{hash(tuple(page_df.index))}")
+    if len(df) > TABLE_PAGE_SIZE:
+        st.caption(f"Rows {(page - 1) * TABLE_PAGE_SIZE + 1}-{(page - 1) * TABLE_PAGE_SIZE + len(page_df)} of {len(df)}")
+    if event.selection.rows:
+        return page_df.iloc[event.selection.rows[0]]
+    return None
 
-        if is_overdue and is_blocked:
-            return ['background-color: #e2d9f3; color: #5a3791; font-weight: bold'] * len(row)
 
-        # 🔴 3. Red: Overdue
-        if is_overdue:
-            return ['background-color: #f8d7da; color: #721c24; font-weight: bold'] * len(row)
+# ------------------------------------------------------------------
+# 🔴 LIVE PANELS (st.fragment: rerun เฉพาะส่วนนั้นตามรอบ หรือเมื่อกดปุ่มในส่วนนั้น ไม่ rerun ทั้ง main_app)
+# ------------------------------------------------------------------
+LIVE_RUN_EVERY = LIVE_REFRESH_SECONDS or None
 
-        # 🟡 4. Yellow: Pending
-        if "pending" in status:
-            return ['background-color: #fff3cd; color: #856404; font-weight: bold'] * len(row)
 
-    except:
-        pass
-    return style
+@st.fragment(run_every=LIVE_RUN_EVERY)
+def live_presence(username):
+    # heartbeat ทุกรอบ (O(1) ใน memory) -> เปิดหน้าค้างไว้ก็ยัง Online
+    # แจ้งเตือน/แชทส่วนตัว: อ่าน store เฉพาะเมื่อ version ของ user นี้เปลี่ยน (รอบแรกของ session อ่านของค้างเสมอ)
+    metrics = get_metrics()
+    signals = get_signals()
+    notify_version, chat_version = signals.version(("notify", username)), signals.version(("chat", username))
+    alerts, messages = [], []
+    try:
+        with metrics.span("heartbeat"):
+            update_heartbeat(username)
+        if st.session_state.get("notify_version") != notify_version:
+            with metrics.span("notifications"):
+                alerts = get_my_notifications(username)
+            st.session_state.notify_version = notify_version
+        if st.session_state.get("chat_version") != chat_version:
+            with metrics.span("chat"):
+                messages = get_my_messages(username)
+            st.session_state.chat_version = chat_version
+    except StorageError as e:
+        log.warning("presence/notification update failed: %s", e)
+    for alert in alerts: st.toast(f"{alert['From_User']}: {alert['Type']}", icon="🔔")
+    for message in messages: st.toast(f"{message['From_User']}: {message['Message']}", icon="💬")
+    # ข้อความที่ได้รับใน session นี้ -> แสดงในแท็บ Chat ของกล่อง Interaction (เก็บแค่ล่าสุด)
+    if messages: st.session_state.chat_inbox = (st.session_state.get("chat_inbox", []) + messages)[-CHAT_INBOX_SIZE:]
+
+    # คำขอ Sync/Relinquish ที่ยังไม่กด Done (ผู้ส่งเห็นจำนวนใน broadcast_status)
+    board = get_broadcasts()
+    for request in board.pending(username):
+        c1, c2 = st.columns([0.85, 0.15])
+        c1.warning(f"🔔 **{request['From_User']}**: {request['Type']} ({request['Group']}) "
+                   f"- {request['Sent'].strftime('%H:%M')}")
+        c2.button("✅ Done", key=f"ack_{request['id']}", use_container_width=True, on_click=board.ack,
+                  args=(request['id'], username))
+
+
+def member_panel_html(df):
+    # การ์ดสมาชิกทั้งหมดเป็น HTML ก้อนเดียว (Online ขึ้นก่อน แล้วเรียงชื่อ)
+    if df.empty: return ""
+    df = df.assign(is_online=df['Status'].str.contains("Online", regex=False).astype(int))
+    cards = []
+    for m_name, m_status in df.sort_values(by=['is_online', 'Name'], ascending=[False, True])[
+            ['Name', 'Status']].itertuples(index=False):
+        dot_color = "#28a745" if "Online" in m_status else ("#dc3545" if "Busy" in m_status else "#6c757d")
+        thumb = get_avatar_cache().thumbnail(m_name)
+        img_src = f"data:image/png;base64,{thumb}" if thumb else \
+            f"https://ui-avatars.com/api/?name={m_name}&background=random&size=64"
+        cards.append(f"""
+        <div style="display: flex; align-items: center; margin-bottom: 6px; padding: 6px; background: #f8f9fa; border-radius: 8px;">
+            <div style="position: relative; margin-right: 10px;">
+                <img src="{img_src}" style="width: 32px; height: 32px; border-radius: 50%;">
+                <span style="position: absolute; bottom: 0; right: 0; width: 8px; height: 8px; bg-color: {dot_color}; border-radius: 50%; background-color: {dot_color}; border: 1.5px solid white;"></span>
+            </div>
+            <div style="line-height: 1.1;">
+                <div style="font-size: 13px; font-weight: 600;">{m_name}</div>
+                <div style="font-size: 11px; color: #666;">{m_status}</div>
+            </div>
+        </div>""")
+    return "".join(cards)
+
+
+@st.fragment(run_every=LIVE_RUN_EVERY)
+def member_panel():
+    # สร้าง HTML ใหม่เฉพาะเมื่อ presence version เปลี่ยน (มีคนเปลี่ยนสถานะ/ถูก auto-offline/เปลี่ยนรูป)
+    version = get_signals().version("presence")
+    cached = st.session_state.get("member_panel")
+    if cached is None or cached[0] != version:
+        with get_metrics().span("panel.members"):
+            cached = (version, member_panel_html(get_presence().frame()))
+        st.session_state.member_panel = cached
+    with st.container(height=300):
+        st.markdown(cached[1], unsafe_allow_html=True)
+
+
+@st.fragment
+def interaction_box(username):
+    # เลือกคน/กลุ่ม แชท ส่งแจ้งเตือน rerun แค่กล่องนี้ (รายชื่อสมาชิกอ่านจาก memory ทุกครั้งที่กล่อง rerun)
+    members = get_presence().frame()
+    target_kind = st.radio("Send to:", ["👤 Member", "📁 File", "🧩 Trade"], horizontal=True,
+                           label_visibility="collapsed")
+
+    if target_kind == "👤 Member":
+        other_users = members.loc[members['Name'] != username, 'Name'].tolist()
+        target_user = st.selectbox("Member:", other_users)
+        if not target_user: return
+        group, recipients = target_user, [target_user]
+
+        t1, t2 = st.tabs(["🔒 Chat", "🔔 Action"])
+        with t1:
+            for message in st.session_state.get("chat_inbox", []):
+                if message['From_User'] == target_user:
+                    st.caption(f"{message['Timestamp']} · {message['Message']}")
+            with st.form("private_chat_form", clear_on_submit=True):
+                pm_msg = st.text_input("Msg:")
+                if st.form_submit_button("Send"):
+                    try:
+                        send_private_message(username, target_user, pm_msg)  # clear_on_submit ล้างช่องให้แล้ว
+                    except StorageError as e:
+                        st.error(f"ส่งข้อความไม่สำเร็จ: {e}")
+        action_box = t2
+    else:
+        if target_kind == "📁 File":
+            group = st.selectbox("File:", FILE_LIST)
+        else:
+            group = st.selectbox("Trade:", FILE_TRADES)
+        recipients = [u for u in group_recipients(members, group) if u != username]
+        st.caption(f"{len(recipients)} คน: {', '.join(recipients)}" if recipients else "ไม่มีใครเปิดไฟล์นี้อยู่")
+        action_box = st.container()
 
+    with action_box:
+        try:
+            for label, msg_type in [("🔄 Sync", "SYNC Central"), ("🔓 Relinquish", "Relinquish All")]:
+                if st.button(label, use_container_width=True, disabled=not recipients):
+                    send_group_notification(username, recipients, msg_type, group)
+                    st.toast(f"Sent to {len(recipients)}!")
+        except StorageError as e:
+            st.error(f"ส่งแจ้งเตือนไม่สำเร็จ: {e}")
 
-def highlight_rfi(row):
-    style = [''] * len(row)
-    try:
-        act = str(row.get('Action By', '')).upper()
-        if any(x in act for x in ["AUR", "STT", "CTA"]):
-            return ['background-color: #fff3cd; color: #856404'] * len(row)
-        if "CLOSED" in act:
-            return ['background-color: #d4edda; color: #155724'] * len(row)
-    except:
-        pass
-    return style
+
+@st.fragment(run_every=LIVE_RUN_EVERY)
+def broadcast_status(username):
+    # คำขอล่าสุดที่ส่งไป: กี่คนกด Done แล้ว และยังรอใคร
+    for request in get_broadcasts().sent(username):
+        acked = [u for u in request['Recipients'] if u in request['Acked']]
+        waiting = [u for u in request['Recipients'] if u not in request['Acked']]
+        st.caption(f"**{request['Type']}** → {request['Group']} ({request['Sent'].strftime('%H:%M')}): "
+                   f"✅ {len(acked)}/{len(request['Recipients'])}" + (f" · รอ {', '.join(waiting)}" if waiting else ""))
 
 
 def main_app():
     # 1. เอา set_page_config ไว้บรรทัดแรกสุด
     st.set_page_config(page_title="BIM Tracker Pro", layout="wide", page_icon="🏗️")
 
-    # (ลบส่วน Auto Refresh ออกไปแล้ว)
+    # (ไม่มี Auto Refresh ทั้งหน้า: heartbeat/แจ้งเตือน/แถบสมาชิก rerun เองเป็น fragment ทุก LIVE_REFRESH_SECONDS)
 
-    init_files()
-    check_auto_offline()
+    metrics = get_metrics()
+    with metrics.span("init_files"):
+        init_files()
+    get_scheduler()  # เริ่มงานเบื้องหลัง (auto-offline / flush heartbeat) ครั้งเดียวต่อ process
 
     if 'logged_in' not in st.session_state: st.session_state.logged_in = False
     if 'username' not in st.session_state: st.session_state.username = ""
@@ -570,8 +2435,11 @@ def main_app():
                         st.session_state.logged_in = True
                         st.session_state.username = u
 
-                        # ✅ บังคับอัพเดทสถานะเป็น Online ทันทีตรงนี้
-                        update_heartbeat(u)
+                        # ✅ บังคับอัพเดทสถานะเป็น Online ทันทีตรงนี้ (เขียนไม่ได้ก็ login ต่อ, heartbeat รอบถัดไปลองใหม่)
+                        try:
+                            update_heartbeat(u)
+                        except StorageError as e:
+                            log.warning("presence update failed: %s", e)
 
                         st.rerun()
                     else:
@@ -580,12 +2448,18 @@ def main_app():
                     st.error("No DB found")
         return
 
-    update_heartbeat(st.session_state.username)
-    alerts = get_my_notifications(st.session_state.username)
-    for alert in alerts: st.toast(f"{alert['From_User']}: {alert['Type']}", icon="🔔")
+    live_presence(st.session_state.username)
 
     st.sidebar.markdown(f"### 👤 {st.session_state.username}")
-    img_b64 = get_image_base64(st.session_state.username)
+    projects = get_projects()
+    project_key = None
+    if len(projects) > 1:
+        project_key = st.sidebar.selectbox("🏗️ Project:", list(projects), format_func=lambda k: projects[k].name,
+                                           key="project")
+    project = get_project(project_key)
+    if pypdf is not None: get_pdf_text_index(project.key)  # เริ่ม index PDF ของโปรเจกต์นี้ (ครั้งแรกที่มีคนเปิด)
+    with metrics.span("avatar"):
+        img_b64 = get_image_base64(st.session_state.username)
     if img_b64:
         st.sidebar.markdown(
             f'<img src="data:image/png;base64,{img_b64}" style="width:80px; height:80px; border-radius:50%; display:block; margin-bottom:10px;">',
@@ -601,16 +2475,24 @@ def main_app():
         st.session_state.logged_in = False
         st.rerun()
 
+    if st.session_state.username in ADMIN_USERS:
+        with st.sidebar.expander("🛠️ Debug Metrics"):
+            if not metrics.enabled:
+                st.caption("ปิดอยู่ (ตั้ง BIM_METRICS=1 แล้ว restart)")
+            else:
+                st.dataframe(metrics.phase_frame(), hide_index=True, use_container_width=True)
+                st.dataframe(metrics.cache_frame(), hide_index=True, use_container_width=True)
+                st.dataframe(metrics.io_frame(), hide_index=True, use_container_width=True)
+                st.dataframe(get_register_cache().usage_frame(), hide_index=True, use_container_width=True)
+                st.caption(f"Prometheus: `{METRICS_FILE}` (ทุก {METRICS_EXPORT_SECONDS} วินาที)")
+
     st.sidebar.divider()
     st.sidebar.markdown("##### 🔧 Work Update")
 
     # Status Load
-    df_current = load_data(STATUS_FILE)
-    my_idx = df_current.index[df_current['Name'] == st.session_state.username].tolist()
-    if not my_idx:
+    my_row = get_presence().get(st.session_state.username)
+    if my_row is None:
         my_row = {"Current_File": "Idle", "Level": "-", "Task_Detail": "-", "Status": "Offline"}
-    else:
-        my_row = df_current.iloc[my_idx[0]]
 
     current_files_str = str(my_row['Current_File'])
     current_files_list = current_files_str.split("|") if current_files_str not in ["Idle", "nan"] else []
@@ -631,23 +2513,24 @@ def main_app():
                                      index=status_map.get(status_key, 0))
 
     if st.sidebar.button("Update Status", use_container_width=True):
-        df_save = load_data(STATUS_FILE)
-        idx_s = df_save.index[df_save['Name'] == st.session_state.username].tolist()
-        if idx_s:
-            i = idx_s[0]
+        if get_presence().get(st.session_state.username) is not None:
             files_to_save = "|".join(selected_files) if selected_files else "Idle"
-            df_save.at[i, 'Current_File'] = files_to_save
-            df_save.at[i, 'Level'] = cur_level
-            df_save.at[i, 'Task_Detail'] = task_dtl
-            df_save.at[i, 'Last_Updated'] = datetime.now().strftime("%H:%M")
             clean_stat = "Online"
             if "Busy" in status_select:
                 clean_stat = "Busy"
             elif "Away" in status_select:
                 clean_stat = "Away"
-            df_save.at[i, 'Status'] = clean_stat
-            save_data(df_save, STATUS_FILE)
-            st.rerun()
+            try:
+                get_presence().update(st.session_state.username, {
+                    "Current_File": files_to_save,
+                    "Level": cur_level,
+                    "Task_Detail": task_dtl,
+                    "Last_Updated": datetime.now().strftime("%H:%M"),
+                    "Status": clean_stat,
+                })
+                st.rerun()
+            except StorageError as e:
+                st.sidebar.error(f"บันทึกสถานะไม่สำเร็จ: {e}")
 
     st.sidebar.divider()
     show_members = st.sidebar.toggle("Show Member Panel", value=True)
@@ -659,7 +2542,8 @@ def main_app():
         col_right = None
 
     # Load Global Data
-    df_rfi_global, rfi_status_map = load_rfi_data_global()
+    with metrics.span("load.rfi"):
+        df_rfi_global, rfi_status_map = load_rfi_data_global(project)
 
     with col_main:
         st.markdown("### 🏗️ BIM Team Tracker")
@@ -669,7 +2553,7 @@ def main_app():
 
         # --- VIEW 1: Team Status ---
         if selected_tab == "👥 Team Status":
-            df_show = load_data(STATUS_FILE)
+            df_show = get_presence().frame()
             df_show['Current_File'] = df_show['Current_File'].astype(str).replace('nan', 'Idle')
             mask = (df_show['Current_File'] != "Idle") | (df_show['Status'].str.contains("Online|Busy|Away"))
             active_df = df_show[mask].copy()
@@ -691,100 +2575,41 @@ def main_app():
 
         # --- VIEW 2: Drawing Board ---
         elif selected_tab == "📋 Drawing Status":
-            st.markdown(f"#### 📑 Master Drawing: `{DRAWING_EXCEL}`")
-            df_excel, msg = load_drawing_excel(rfi_status_map)
+            st.markdown(f"#### 📑 Master Drawing: `{project.drawing_excel}`")
+            with metrics.span("load.drawing"):
+                df_excel, msg = load_drawing_excel(project)
 
             if not df_excel.empty:
-                # 1. Logic
-                def get_month_key(val):
-                    try:
-                        if pd.isna(val) or val == "-" or val == "": return None
-                        dt = datetime.strptime(str(val), '%d %b %Y')
-                        return dt.strftime('%Y-%m')
-                    except:
-                        return None
-
-                df_excel['Filter_Month'] = df_excel['Planned Submission'].apply(get_month_key)
-
-                today = date.today()
-
-                def get_color_category(row):
-                    status = str(row.get('Status', '')).lower()
-                    approve = str(row.get('Approval Date', ''))
-                    planned = str(row.get('Planned Submission', ''))
-                    submit = str(row.get('Submission Date', ''))
-                    is_blocked = row.get('Is_Blocked', False)
-
-                    # 1. Green: Approved/Closed
-                    is_approved = False
-                    if approve != "-" and approve != "": is_approved = True
-                    if any(x in status for x in ["closed", "a", "b"]): is_approved = True
-                    if is_approved: return "🟢 Approved/Closed"
-
-                    # Check Overdue Condition
-                    is_overdue = False
-                    if "overdue" in status or "delayed" in status or "revise" in status: is_overdue = True
-                    if (submit == "-" or submit == "") and (planned != "-" and planned != ""):
-                        try:
-                            if datetime.strptime(planned, '%d %b %Y').date() < today: is_overdue = True
-                        except:
-                            pass
-
-                    # 2. Purple & Red & Yellow
-                    if is_overdue and is_blocked: return "🟣 Overdue & Blocked"
-                    if is_overdue: return "🔴 Overdue"
-                    if "pending" in status: return "🟡 Pending"
-                    return "⚪ Normal"
-
-                df_excel['Status_Color'] = df_excel.apply(get_color_category, axis=1)
-
-                # 2. Filter Controls
+                # 1. Filter Controls
                 col_f1, col_f2, col_f3 = st.columns([1, 1, 1])
 
+                cube = load_drawing_cube(project)
                 with col_f1:
-                    all_trades = ["ALL"] + sorted(
-                        [str(x) for x in df_excel['Trade'].unique() if str(x) not in ["nan", "-"]])
+                    all_trades = ["ALL"] + cube.trades()
                     sel_trade = st.selectbox("📂 Filter Trade:", all_trades)
 
                 with col_f2:
-                    available_months = sorted([x for x in df_excel['Filter_Month'].unique() if x is not None])
+                    available_months = cube.months()
                     sel_months = st.multiselect("📅 Planned Month:", available_months)
 
                 with col_f3:
-                    color_options = ["🟢 Approved/Closed", "🟣 Overdue & Blocked", "🔴 Overdue", "🟡 Pending", "⚪ Normal"]
-                    sel_colors = st.multiselect("🎨 Status Color:", color_options)
+                    sel_colors = st.multiselect("🎨 Status Color:", STATUS_COLORS)
 
                 search_query = st.text_input("🔍 Search (Description / RFAS / Level):", "")
 
-                # 3. Apply Filters
-                df_display = df_excel.copy()
+                # 2. Apply Filters (รวมเป็น mask เดียวแล้วเลือกแถวครั้งเดียว; df_excel ใช้ร่วมทุก session ห้ามแก้)
+                with metrics.span("drawing.filter"):
+                    df_display = df_excel[drawing_filter_mask(df_excel, sel_trade, sel_months, sel_colors,
+                                                              search_query and load_drawing_search_index(project),
+                                                              search_query)]
 
-                if sel_trade != "ALL":
-                    df_display = df_display[df_display['Trade'] == sel_trade]
-
-                if sel_months:
-                    df_display = df_display[df_display['Filter_Month'].isin(sel_months)]
-
-                if sel_colors:
-                    df_display = df_display[df_display['Status_Color'].isin(sel_colors)]
-
-                if search_query:
-                    search_query = search_query.lower()
-                    mask = (
-                            df_display['Document Description'].astype(str).str.lower().str.contains(search_query,
-                                                                                                    na=False) |
-                            df_display['RFAS Doc No.'].astype(str).str.lower().str.contains(search_query, na=False) |
-                            df_display['Trade'].astype(str).str.lower().str.contains(search_query, na=False)
-                    )
-                    df_display = df_display[mask]
-
-                # 4. Dashboard Metrics
+                # 3. Dashboard Metrics
                 st.markdown("---")
 
-                total_view = len(df_display)
-                submitted_view = len(df_display[df_display['Submission Date'] != "-"])
-                approved_view = len(df_display[df_display['Status_Color'] == "🟢 Approved/Closed"])
-                overdue_view = len(df_display[df_display['Status_Color'].isin(["🟣 Overdue & Blocked", "🔴 Overdue"])])
+                # ไม่มี search -> ตอบจาก cube; มี search -> นับจากแถวที่ค้นเจอ
+                counts = drawing_metric_flags(df_display).sum() if search_query else \
+                    cube.totals(sel_trade, sel_months, sel_colors)
+                total_view, submitted_view, approved_view, overdue_view = counts
 
                 m1, m2, m3, m4 = st.columns(4)
                 m1.metric("Total Drawings", f"{total_view} Sheets")
@@ -795,27 +2620,18 @@ def main_app():
 
                 st.markdown("---")
 
-                # 5. Show Data Table
-                df_show_table = df_display.drop(columns=['Filter_Month', 'Status_Color'], errors='ignore')
-
-                event = st.dataframe(
-                    df_show_table.style.apply(highlight_drawing, axis=1),
-                    use_container_width=True,
-                    height=600,
-                    hide_index=True,
-                    on_select="rerun",
-                    selection_mode="single-row",
-                    column_order=["Trade", "RFAS Doc No.", "Document Description", "Linked RFI",
-                                  "Planned Submission", "Submission Date", "Status", "Action", "Revision"]
+                # 4. Show Data Table (ทีละหน้า, สีจาก Style_Class)
+                sel_row = paged_table(
+                    df_display, "drawing_table",
+                    ["Trade", "RFAS Doc No.", "Document Description", "Linked RFI",
+                     "Planned Submission", "Submission Date", "Status", "Action", "Revision"]
                 )
 
-                # 6. RFI Link Action
-                if event.selection.rows:
-                    idx = event.selection.rows[0]
-                    sel_row = df_display.iloc[idx]
+                # 5. RFI Link Action
+                if sel_row is not None:
                     rfas_no = str(sel_row["RFAS Doc No."]).strip()
                     current_link = str(sel_row["Linked RFI"])
-                    unique_key_suffix = f"{rfas_no}_{idx}"
+                    unique_key_suffix = f"{rfas_no}_{sel_row.name}"
 
                     st.divider()
 
@@ -858,20 +2674,24 @@ def main_app():
                                         f"""<div style="background-color: {bg_color}; color: {text_color}; padding: 5px 10px; border-radius: 6px; border: 1px solid {border_color}; font-size: 13px; font-weight: 600; margin-bottom: 4px;">{rfi_item} ({rfi_stat})</div>""",
                                         unsafe_allow_html=True)
                                 with c2:
-                                    if st.button("📂", key=f"btn_open_{rfi_item}_{unique_key_suffix}", help="Open PDF"):
-                                        open_pdf(rfi_item)
+                                    has_pdf = get_document_index(project.key).lookup(rfi_item) is not None
+                                    if st.button("📂", key=f"btn_open_{rfi_item}_{unique_key_suffix}",
+                                                 help="Open PDF" if has_pdf else "No PDF in repo", disabled=not has_pdf):
+                                        open_pdf(rfi_item, project)
 
                         if st.button("💾 Save Link", key=f"btn_save_{unique_key_suffix}"):
                             new_link_str = ", ".join(selected_rfis)
-                            save_rfi_link(rfas_no, new_link_str)
-                            st.success(f"บันทึกข้อมูลเรียบร้อย! (บันทึกชั่วคราวใน Session)")
-                            st.cache_data.clear()
-                            time.sleep(0.5)
-                            st.rerun()
+                            try:
+                                save_rfi_link(rfas_no, new_link_str, project)
+                                st.success(f"บันทึกข้อมูลเรียบร้อย! (บันทึกชั่วคราวใน Session)")
+                                time.sleep(0.5)
+                                st.rerun()
+                            except StorageError as e:
+                                st.error(f"บันทึก Link ไม่สำเร็จ: {e}")
 
         # --- VIEW 3: RFI Status ---
         elif selected_tab == "📩 RFI Status":
-            st.markdown(f"#### 📩 Master RFI: `{RFI_EXCEL}`")
+            st.markdown(f"#### 📩 Master RFI: `{project.rfi_excel}`")
             if not df_rfi_global.empty:
                 col_r1, col_r2 = st.columns([1, 2])
                 with col_r1:
@@ -882,39 +2702,50 @@ def main_app():
                 with col_r2:
                     rfi_search = st.text_input("🔍 Search RFI:", key="rfi_search")
 
-                df_rfi_show = df_rfi_global.copy()
-                if sel_rfi_trade != "ALL": df_rfi_show = df_rfi_show[df_rfi_show['Trade'] == sel_rfi_trade]
-                if rfi_search:
-                    q = rfi_search.lower()
-                    mask = (df_rfi_show['Document Description'].astype(str).str.lower().str.contains(q, na=False) |
-                            df_rfi_show['Doc Ref No.'].astype(str).str.lower().str.contains(q, na=False))
-                    df_rfi_show = df_rfi_show[mask]
-
-                event_r = st.dataframe(
-                    df_rfi_show.reset_index(drop=True).style.apply(highlight_rfi, axis=1),
-                    use_container_width=True,
-                    height=600,
-                    hide_index=True,
-                    on_select="rerun",
-                    selection_mode="single-row",
-                    column_order=["Trade", "Doc Ref No.", "Document Description", "Actual Submission Date", "Action By",
-                                  "Approved Status"]
+                with metrics.span("rfi.filter"):
+                    mask = np.ones(len(df_rfi_global), dtype=bool)
+                    if sel_rfi_trade != "ALL": mask &= (df_rfi_global['Trade'] == sel_rfi_trade).to_numpy()
+                    if rfi_search:
+                        mask &= df_rfi_global.index.isin(load_rfi_search_index(project).search(rfi_search))
+                    df_rfi_show = df_rfi_global[mask]
+
+                selected_row = paged_table(
+                    df_rfi_show, "rfi_table",
+                    ["Trade", "Doc Ref No.", "Document Description", "Actual Submission Date", "Action By",
+                     "Approved Status"]
                 )
 
-                if event_r.selection.rows:
-                    idx = event_r.selection.rows[0]
-                    selected_row = df_rfi_show.iloc[idx]
+                if selected_row is not None:
                     doc_no = selected_row['Doc Ref No.']
                     action = str(selected_row['Action By']).upper()
 
                     if any(x in action for x in ["AUR", "STT", "CLOSED"]):
                         st.info(f"Selected: **{doc_no}** (Action: {action})")
                         if st.button("📂 Download/Open PDF", type="primary", use_container_width=True):
-                            open_pdf(doc_no)
+                            open_pdf(doc_no, project)
                     else:
                         st.warning(f"Selected: {doc_no} (Action: {action}) - PDF available only for AUR/STT/Closed.")
 
                 st.caption(f"Total Rows: {len(df_rfi_show)}")
+
+                if pypdf is not None:
+                    pdf_query = st.text_input("📄 Search inside RFI PDFs:", key="rfi_pdf_search")
+                    if pdf_query:
+                        pdf_hits = get_pdf_text_index(project.key).search(pdf_query)
+                        pdf_hits = pdf_hits.merge(df_rfi_global[['Doc Ref No.', 'Document Description', 'Action By']],
+                                                  on='Doc Ref No.', how='left')
+                        st.dataframe(pdf_hits, use_container_width=True, hide_index=True,
+                                     column_order=["Doc Ref No.", "Document Description", "Action By", "Snippet",
+                                                   "File"])
+                        index_status = get_pdf_text_index(project.key).status()
+                        st.caption(f"{len(pdf_hits)} hit(s) from {index_status['indexed']} indexed PDFs"
+                                   + (" (indexing…)" if index_status['running'] else ""))
+
+                missing_pdf = get_document_index(project.key).missing(
+                    df_rfi_global['Doc Ref No.'].dropna().astype(str).unique())
+                if missing_pdf:
+                    with st.expander(f"⚠️ RFI ที่ยังไม่มีไฟล์ PDF ({len(missing_pdf)})"):
+                        st.write(", ".join(missing_pdf))
             else:
                 st.info("No RFI Data Found.")
 
@@ -922,59 +2753,26 @@ def main_app():
     if show_members and col_right:
         with col_right:
             st.subheader("👥 Members")
-            member_container = st.container(height=300)
-            with member_container:
-                df_show = load_data(STATUS_FILE)
-                if not df_show.empty:
-                    df_show['is_online'] = df_show['Status'].apply(lambda x: 1 if "Online" in str(x) else 0)
-                    df_sorted = df_show.sort_values(by=['is_online', 'Name'], ascending=[False, True])
-
-                    for _, row in df_sorted.iterrows():
-                        m_name = row['Name']
-                        m_status = row['Status']
-                        dot_color = "#28a745" if "Online" in m_status else (
-                            "#dc3545" if "Busy" in m_status else "#6c757d")
-                        img_src = f"data:image/png;base64,{get_image_base64(m_name)}" if get_image_base64(
-                            m_name) else f"https://ui-avatars.com/api/?name={m_name}&background=random&size=64"
-
-                        st.markdown(f"""
-                        <div style="display: flex; align-items: center; margin-bottom: 6px; padding: 6px; background: #f8f9fa; border-radius: 8px;">
-                            <div style="position: relative; margin-right: 10px;">
-                                <img src="{img_src}" style="width: 32px; height: 32px; border-radius: 50%;">
-                                <span style="position: absolute; bottom: 0; right: 0; width: 8px; height: 8px; bg-color: {dot_color}; border-radius: 50%; background-color: {dot_color}; border: 1.5px solid white;"></span>
-                            </div>
-                            <div style="line-height: 1.1;">
-                                <div style="font-size: 13px; font-weight: 600;">{m_name}</div>
-                                <div style="font-size: 11px; color: #666;">{m_status}</div>
-                            </div>
-                        </div>""", unsafe_allow_html=True)
+            member_panel()
 
             st.markdown("---")
             st.subheader("💬 Interaction")
-            other_users = df_show[df_show['Name'] != st.session_state.username][
-                'Name'].tolist() if not df_show.empty else []
-            target_user = st.selectbox("Member:", other_users)
-
-            if target_user:
-                t1, t2 = st.tabs(["🔒 Chat", "🔔 Action"])
-                with t1:
-                    with st.form("private_chat_form", clear_on_submit=True):
-                        pm_msg = st.text_input("Msg:")
-                        if st.form_submit_button("Send"):
-                            send_private_message(st.session_state.username, target_user, pm_msg)
-                            st.rerun()
-                with t2:
-                    if st.button("🔄 Sync", use_container_width=True):
-                        send_notification(target_user, st.session_state.username, "SYNC Central")
-                        st.toast("Sent!")
-                    if st.button("🔓 Relinquish", use_container_width=True):
-                        send_notification(target_user, st.session_state.username, "Relinquish All")
-                        st.toast("Sent!")
+            interaction_box(st.session_state.username)
+            broadcast_status(st.session_state.username)
 
     if st.sidebar.button("🔄 Refresh Data", use_container_width=True):
         st.rerun()
 
 
 # Run main app directly
+# python WPS.py export-csv  -> เขียนข้อมูลจาก SQLite กลับเป็นไฟล์ CSV เดิม
+# python WPS.py report [--projects ...] [--format csv xlsx json] [--out reports] [--date YYYY-MM-DD]
 if __name__ == "__main__":
-    main_app()
+    if sys.argv[1:2] == ["export-csv"]:
+        init_files()
+        get_store().export_csv()
+    elif sys.argv[1:2] == ["report"]:
+        sys.exit(run_reports(sys.argv[2:]))
+    else:
+        with get_metrics().span("rerun"):
+            main_app()
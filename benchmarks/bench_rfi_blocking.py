@@ -0,0 +1,84 @@
+# Benchmark: RFI blocking แบบ columnar join (WPS._apply_rfi_blocking) เทียบกับ loop iterrows เดิม
+# วิธีรัน:  python benchmarks/bench_rfi_blocking.py [จำนวน drawing ...]
+import os
+import sys
+import time
+import random
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import WPS  # noqa: E402
+
+TRADES = ["AR", "ST", "CSD", "ME", "EL", "HY", "FI"]
+
+
+def legacy_blocking(final, rfi_status_map, df_links):
+    # loop เดิมก่อนเปลี่ยนเป็น join (คงไว้เพื่อเทียบเวลาและผลลัพธ์)
+    links_dict = {}
+    if not df_links.empty:
+        links_dict = dict(zip(df_links['Drawing_RFAS'], df_links['Linked_RFI']))
+
+    link_list = []
+    block_list = []
+    for _, row in final.iterrows():
+        rfas = str(row["RFAS Doc No."])
+        l_rfi = links_dict.get(rfas, "")
+        is_blocked = False
+
+        if l_rfi:
+            rfis = [x.strip() for x in l_rfi.split(',')]
+            for r in rfis:
+                act = rfi_status_map.get(r, "PENDING")
+                if not any(x in act for x in ["CLOSED"]):
+                    is_blocked = True
+
+        link_list.append(l_rfi)
+        block_list.append(is_blocked)
+
+    final = final.copy()
+    final["Linked RFI"] = link_list
+    final["Is_Blocked"] = block_list
+    return final
+
+
+def make_data(n_drawings, link_ratio=0.3, seed=42):
+    rnd = random.Random(seed)
+    drawings = [f"523213-01-RFAS-{TRADES[i % len(TRADES)]}-{i:05d}" for i in range(n_drawings)]
+    rfis = [f"523213-01-RFI-{TRADES[i % len(TRADES)]}-{i:05d}" for i in range(max(10, n_drawings // 3))]
+    rfi_map = {r: rnd.choice(["CLOSED", "AUR", "STT", "CTA", "-"]) for r in rfis}
+
+    final = pd.DataFrame({"RFAS Doc No.": drawings, "Trade": [d.split("-")[3] for d in drawings]})
+    linked = rnd.sample(drawings, int(n_drawings * link_ratio))
+    # บาง RFI ไม่มีใน register -> ต้องนับเป็น PENDING
+    pool = rfis + [f"523213-01-RFI-XX-{i:05d}" for i in range(5)]
+    df_links = pd.DataFrame({
+        "Drawing_RFAS": linked,
+        "Linked_RFI": [", ".join(rnd.sample(pool, rnd.randint(1, 6))) for _ in linked],
+    })
+    return final, rfi_map, df_links
+
+
+def best_of(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def run(sizes):
+    print(f"{'drawings':>10} {'links':>8} {'legacy (s)':>12} {'join (s)':>10} {'speedup':>9}")
+    for n in sizes:
+        final, rfi_map, df_links = make_data(n)
+        t_old, old = best_of(lambda: legacy_blocking(final, rfi_map, df_links))
+        t_new, new = best_of(lambda: WPS._apply_rfi_blocking(final, rfi_map, WPS.build_rfi_link_table(df_links)))
+
+        pd.testing.assert_series_equal(old["Linked RFI"], new["Linked RFI"], check_dtype=False)
+        pd.testing.assert_series_equal(old["Is_Blocked"], new["Is_Blocked"], check_dtype=False)
+        print(f"{n:>10} {len(df_links):>8} {t_old:>12.4f} {t_new:>10.4f} {t_old / t_new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    run([int(x) for x in sys.argv[1:]] or [500, 5000, 50000])
@@ -0,0 +1,173 @@
+# Benchmark ชุดหลักของ WPS.py บนข้อมูลจำลอง (benchmarks/synthetic.py) หลายขนาด -> ผลเป็น JSON ไว้เทียบระหว่างเวอร์ชัน
+# วิธีรัน:  python benchmarks/bench_suite.py [--sizes 500 5000 100000] [--output ผล.json] [--compare ผลเก่า.json]
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import warnings
+import logging
+import subprocess
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import WPS  # noqa: E402
+import synthetic  # noqa: E402
+from bench_rfi_blocking import best_of  # noqa: E402
+
+# streamlit เตือนทุกครั้งที่เรียก cache_resource นอก `streamlit run`
+warnings.filterwarnings("ignore")
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+TODAY = date(2026, 6, 1)
+QUERIES = ["level", "level 2 plan", "rfas-el", "0012", "shaft detail"]
+
+
+def _reset_caches():
+    # singleton ของ WPS ผูกกับไฟล์ในโฟลเดอร์ที่ chdir เข้าไป -> ล้างก่อนเปลี่ยน dataset
+    for fn in (WPS.get_store, WPS.get_project_store, WPS.get_presence, WPS.get_broadcasts, WPS.get_register_cache):
+        fn.clear()
+
+
+def filter_drawings(df, index, trade, months, colors, query):
+    # เหมือน Drawing tab ใน main_app
+    return df[WPS.drawing_filter_mask(df, trade, months, colors, index, query)]
+
+
+def bench_size(n, repeat):
+    results = {}
+
+    def record(name, seconds, **extra):
+        results[name] = dict(seconds=round(seconds, 6), **extra)
+        print(f"{n:>8} {name:<40} {seconds * 1000:>10.2f} ms")
+
+    # --- Excel: parse ครั้งแรก (ไม่มี snapshot) เทียบกับเปิดซ้ำ (snapshot hit) ---
+    def cold_rfi():
+        shutil.rmtree(WPS.SNAPSHOT_FOLDER, ignore_errors=True)
+        return WPS._read_rfi_excel()
+
+    t, (df_rfi, rfi_map) = best_of(cold_rfi, repeat)
+    record("read_rfi_excel.cold", t, rows=len(df_rfi))
+    t, _ = best_of(WPS._read_rfi_excel, repeat)
+    record("read_rfi_excel.snapshot", t)
+
+    def cold_drawing():
+        shutil.rmtree(WPS.SNAPSHOT_FOLDER, ignore_errors=True)
+        return WPS._read_drawing_excel(rfi_map)
+
+    t, (df_drawing, _) = best_of(cold_drawing, repeat)
+    record("read_drawing_excel.cold", t, rows=len(df_drawing))
+    t, _ = best_of(lambda: WPS._read_drawing_excel(rfi_map), repeat)
+    record("read_drawing_excel.snapshot", t)
+
+    # --- สถานะ/สี และ filter/search ---
+    t, classified = best_of(lambda: WPS.classify_drawings(df_drawing, TODAY), repeat)
+    record("classify_drawings", t)
+
+    t, index = best_of(lambda: WPS.SearchIndex(classified, WPS.DRAWING_SEARCH_COLUMNS), repeat)
+    record("search_index.build", t)
+    months = sorted(classified['Filter_Month'].dropna().unique())[:3]
+    t, _ = best_of(lambda: [filter_drawings(classified, index, "ALL", [], [], q) for q in QUERIES], repeat)
+    record("search.per_query", t / len(QUERIES))
+    t, shown = best_of(lambda: filter_drawings(classified, index, "Electrical", months,
+                                               [WPS.COLOR_OVERDUE, WPS.COLOR_PENDING], "level"), repeat)
+    record("filter.trade_month_color_search", t, rows=len(shown))
+
+    # --- การ์ดตัวเลข: สแกนแถวที่ filter แล้ว เทียบกับรวม cell ของ cube ---
+    t, cube = best_of(lambda: WPS.DrawingCube(classified), repeat)
+    record("metrics_cube.build", t, cells=len(cube.cells))
+    colors = [WPS.COLOR_OVERDUE, WPS.COLOR_PENDING]
+    t, _ = best_of(lambda: WPS.drawing_metric_flags(
+        filter_drawings(classified, index, "Electrical", months, colors, "")).sum(), repeat)
+    record("metrics.row_scan", t)
+    t, _ = best_of(lambda: cube.totals("Electrical", months, colors), repeat)
+    record("metrics.cube", t)
+
+    # --- ทีม: heartbeat / แจ้งเตือน ---
+    users = WPS.get_presence().frame()['Name'].tolist()
+    calls = 1000
+    t, _ = best_of(lambda: [WPS.update_heartbeat(users[i % len(users)]) for i in range(calls)], repeat)
+    record("update_heartbeat.per_call", t / calls)
+
+    per_user = max(1, n // 100)
+    for i in range(per_user):
+        WPS.send_group_notification(users[i % len(users)], users, "SYNC Central", "Central")
+    t0 = time.perf_counter()
+    received = sum(len(WPS.get_my_notifications(u)) for u in users)
+    record("get_my_notifications.backlog_per_user", (time.perf_counter() - t0) / len(users), received=received)
+    t, _ = best_of(lambda: [WPS.get_my_notifications(u) for u in users], repeat)
+    record("get_my_notifications.empty_per_user", t / len(users))
+
+    # แจ้งเตือนทั้งกลุ่ม 15 คน: ส่งทีละคน เทียบกับ append ครั้งเดียว
+    group = users[1:16]
+    t, _ = best_of(lambda: [WPS.send_group_notification(users[0], [u], "Relinquish All", "Central-MEP")
+                            for u in group], repeat)
+    record("send_group_notification.group_15_single", t, recipients=len(group))
+    t, _ = best_of(lambda: WPS.send_group_notification(users[0], group, "Relinquish All", "Central-MEP"), repeat)
+    record("send_group_notification.group_15_batched", t, recipients=len(group))
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline_path):
+    # แสดงอัตราส่วนเวลา ใหม่/เก่า (>1 = ช้าลง)
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\ncompare with {baseline_path} ({baseline.get('revision')})")
+    for size, benches in current["results"].items():
+        for name, result in benches.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if old and old["seconds"] > 0:
+                ratio = result["seconds"] / old["seconds"]
+                flag = "  <-- slower" if ratio > 1.2 else ""
+                print(f"{size:>8} {name:<40} {ratio:>6.2f}x{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 100000], help="จำนวนแถว Shop Drawing")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", choices=["sqlite", "csv"], default=WPS.STORAGE_BACKEND)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                                         datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"))
+    parser.add_argument("--compare", help="ไฟล์ผลเก่าที่จะเทียบ")
+    args = parser.parse_args(argv)
+
+    WPS.STORAGE_BACKEND = args.backend
+    report = {"revision": _git_revision(), "created": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "cpus": os.cpu_count(), "backend": args.backend,
+              "ingest_workers": WPS.INGEST_WORKERS, "results": {}}
+    cwd = os.getcwd()
+    for n in args.sizes:
+        workdir = tempfile.mkdtemp(prefix=f"bim-bench-{n}-")
+        try:
+            synthetic.make_dataset(workdir, n)
+            os.chdir(workdir)  # path ทั้งหมดใน WPS เป็น relative กับโฟลเดอร์ปัจจุบัน
+            _reset_caches()
+            WPS.init_files()
+            report["results"][str(n)] = bench_size(n, args.repeat)
+        finally:
+            os.chdir(cwd)
+            _reset_caches()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults -> {args.output}")
+    if args.compare: compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
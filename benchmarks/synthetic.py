@@ -0,0 +1,140 @@
+# สร้างข้อมูลจำลองสำหรับ benchmark: Shop Drawing / RFI workbook (layout เดียวกับไฟล์จริง) + CSV link/status/chat
+# วิธีรัน:  python benchmarks/synthetic.py <โฟลเดอร์ปลายทาง> <จำนวน drawing>
+import os
+import sys
+import csv
+import random
+from datetime import datetime, timedelta
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import WPS  # noqa: E402
+
+PROJECT = "523213-01"
+# ลำดับ sheet ตามไฟล์จริง (RFI ไม่มี CSD)
+DRAWING_SHEETS = ["AR", "ST", "EL", "ME", "HY", "FI", "CSD"]
+RFI_SHEETS = ["ST", "AR", "EL", "FI", "ME", "HY"]
+
+LEGEND = "Status: (A) Approved with No Comments, (B) Approved with Comments, (C) Revise & Resubmit"
+DRAWING_HEADERS = ["S/N", "Trade", "SDW Doc No.", "Document Description", "RFAS Doc No.", "Planned Submission",
+                   "Submission Date", "Consultant Respond Date", "Rev", "Action", "Status", "Approval Date", "Scope",
+                   "Remarks", "Rev 0", None, None, None, None, "Rev 1"]
+RFI_HEADERS = ["S/N", "Trade", "Doc Ref No.", "Document Description", "Planned Date", "Submission Date",
+               "Consultant Respond Date", "Rev", "Action", "Status", "Approval Date", "Remarks", "Rev 0", None, None,
+               None, None, "Rev 1"]
+REV_SUBHEADER = ["Submitted", "CTA", "AUR", "STT", "Status", "Submitted"]
+
+LEVELS = ["Level 1", "Level 2", "Level 3", "Level 4", "Level 5", "Roof", "Basement"]
+SUBJECTS = ["Overall Base Plan", "Ceiling Plan", "Wall Setting Out", "Door Schedule", "Section A-A", "Shaft Detail",
+            "Toilet Layout", "Cable Tray Routing", "Sprinkler Layout", "Chiller Plant", "Riser Diagram"]
+RFI_SUBJECTS = ["Partition wall or Block Wall", "Confirm Ceiling Type", "Clarify Door Frame Depth",
+                "Confirm Colour Code", "Waterproofing Termination Level", "Cable Size in MCC Panel",
+                "Pre-Action System for Comm Riser", "FCU Fan Type", "Floor Tiles Size and Layout"]
+ACTIONS = ["GAA", "CTA", "AUR", "STT", "Closed"]
+DRAWING_STATUS = ["A", "B", "C", "Pending", "Pending", "Overdue", None]
+RFI_STATUS = ["A", "B", "Pending", None]
+
+
+def _split(n, sheets):
+    # แบ่งจำนวนแถวให้แต่ละ sheet ไม่เท่ากัน (เหมือนไฟล์จริงที่ EL/AR เยอะกว่า)
+    weights = [3, 1, 4, 2, 2, 2, 3][:len(sheets)]
+    counts = [n * w // sum(weights) for w in weights]
+    counts[0] += n - sum(counts)
+    return dict(zip(sheets, counts))
+
+
+def _dates(rnd, start):
+    planned = start + timedelta(days=rnd.randint(0, 365))
+    submitted = planned + timedelta(days=rnd.randint(-5, 20)) if rnd.random() < 0.6 else None
+    respond = submitted + timedelta(days=7) if submitted and rnd.random() < 0.8 else None
+    approved = respond + timedelta(days=rnd.randint(1, 14)) if respond and rnd.random() < 0.4 else None
+    return planned, submitted, respond, approved
+
+
+def _write_sheet(wb, sheet, headers, rows):
+    ws = wb.create_sheet(sheet)
+    ws.append([LEGEND] + [None] * (len(headers) - 1))
+    ws.append(headers)  # header อยู่แถวที่ 2
+    ws.append([None] * (len(headers) - len(REV_SUBHEADER)) + REV_SUBHEADER)
+    for row in rows:
+        ws.append(row)
+
+
+def make_drawing_workbook(path, n_rows, seed=1):
+    rnd = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    wb = openpyxl.Workbook(write_only=True)
+    for name in ["Overview", "Summary"]: wb.create_sheet(name)
+    refs = []
+    for sheet, count in _split(n_rows, DRAWING_SHEETS).items():
+        rows = []
+        for i in range(1, count + 1):
+            rfas = f"{PROJECT}-RFAS-{sheet}-{i:05d}"
+            refs.append(rfas)
+            planned, submitted, respond, approved = _dates(rnd, start)
+            rows.append([i, WPS.SHEET_MAPPING[sheet], f"{PROJECT}-SDW-{sheet}-{i:05d}",
+                         f"{rnd.choice(LEVELS)} - {rnd.choice(SUBJECTS)}", rfas, planned, submitted, respond,
+                         rnd.randint(0, 3), rnd.choice(ACTIONS), rnd.choice(DRAWING_STATUS), approved, "GC", None,
+                         submitted])
+        _write_sheet(wb, sheet, DRAWING_HEADERS, rows)
+    wb.save(path)
+    return refs
+
+
+def make_rfi_workbook(path, n_rows, seed=2):
+    rnd = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    wb = openpyxl.Workbook(write_only=True)
+    for name in ["Overview", "Summary"]: wb.create_sheet(name)
+    refs = []
+    for sheet, count in _split(n_rows, RFI_SHEETS).items():
+        rows = []
+        for i in range(1, count + 1):
+            ref = f"{PROJECT}-RFI-{sheet}-{i:04d}"
+            refs.append(ref)
+            _, submitted, respond, approved = _dates(rnd, start)
+            rows.append([i, WPS.SHEET_MAPPING[sheet], ref, f"{rnd.choice(RFI_SUBJECTS)} {rnd.choice(LEVELS)}", None,
+                         submitted, respond, 0, rnd.choice(ACTIONS), rnd.choice(RFI_STATUS), approved, None,
+                         submitted])
+        _write_sheet(wb, sheet, RFI_HEADERS, rows)
+    wb.save(path)
+    return refs
+
+
+def _write_csv(path, columns, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def make_team_files(folder, drawing_refs, rfi_refs, users, n_chat, link_ratio=0.3, seed=3):
+    rnd = random.Random(seed)
+    linked = rnd.sample(drawing_refs, int(len(drawing_refs) * link_ratio))
+    _write_csv(os.path.join(folder, os.path.basename(WPS.RFI_LINKS_FILE)), WPS.LINK_COLUMNS,
+               [[d, ", ".join(rnd.sample(rfi_refs, min(len(rfi_refs), rnd.randint(1, 4))))] for d in linked])
+
+    now = datetime(2026, 3, 1, 9, 0)
+    _write_csv(os.path.join(folder, os.path.basename(WPS.STATUS_FILE)), WPS.STATUS_COLUMNS,
+               [[u, rnd.choice(WPS.FILE_LIST), rnd.choice(WPS.LEVEL_LIST), "-", now.strftime("%d/%m %H:%M"),
+                 now.strftime("%Y-%m-%d %H:%M:%S"), rnd.choice(["🟢 Online", "🔴 Busy", "⚪ Offline"])] for u in users])
+    _write_csv(os.path.join(folder, os.path.basename(WPS.PRIVATE_CHAT_FILE)), WPS.CHAT_COLUMNS,
+               [[now.strftime("%H:%M"), rnd.choice(users), rnd.choice(users), f"message {i}"] for i in range(n_chat)])
+    _write_csv(os.path.join(folder, os.path.basename(WPS.CREDENTIALS_FILE)), ["Username", "Password"],
+               [[u, "1234"] for u in users])
+
+
+def make_dataset(folder, n_drawings, n_users=20):
+    # n_drawings แถวใน Shop Drawing, RFI = 1/3 ของนั้น, แชท = 1/10
+    os.makedirs(folder, exist_ok=True)
+    drawing_refs = make_drawing_workbook(os.path.join(folder, WPS.DRAWING_EXCEL), n_drawings)
+    rfi_refs = make_rfi_workbook(os.path.join(folder, WPS.RFI_EXCEL), max(10, n_drawings // 3))
+    # ต้องมี Weera ไม่งั้น init_files() จะนึกว่าเป็นไฟล์รุ่นเก่าแล้ว reset status/credentials ทิ้ง
+    users = ["Weera"] + [f"User_{i:02d}" for i in range(1, n_users)]
+    make_team_files(folder, drawing_refs, rfi_refs, users, n_chat=max(10, n_drawings // 10))
+    return users
+
+
+if __name__ == "__main__":
+    make_dataset(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
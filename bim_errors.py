@@ -0,0 +1,7 @@
+# exception ที่ต้องเป็น class เดียวกันทุก rerun
+# Streamlit รัน WPS.py ใหม่ทุก rerun -> class ที่นิยามใน WPS.py เป็น object ใหม่ทุกรอบ แต่ store ใน st.cache_resource
+# ยัง raise class ของรอบที่สร้าง store; นิยามไว้ที่นี่ except StorageError ใน rerun ไหนก็จับได้
+
+
+class StorageError(Exception):
+    pass
@@ -0,0 +1,138 @@
+# งานที่ส่งเข้า process pool ของ WPS.py (parse workbook, แยกข้อความ PDF)
+# อยู่นอก WPS.py เพราะ Streamlit รัน WPS.py เป็น __main__ ตัวใหม่ทุก rerun -> function ใน __main__ pickle ส่งให้ worker
+# ไม่ได้ตั้งแต่ rerun ที่ 2; module นี้ import ตามชื่อได้เสมอ และไม่ต้องโหลด streamlit
+import logging
+
+import openpyxl
+import pandas as pd
+
+try:
+    import pypdf
+except ImportError:  # WPS.py เช็ค pypdf เองก่อนส่งงาน PDF เข้ามา
+    pypdf = None
+
+# ------------------------------------------------------------------
+# 📖 STREAMING WORKBOOK READER (อ่านครั้งเดียว เอาเฉพาะคอลัมน์ที่ใช้)
+# ------------------------------------------------------------------
+# ค่าที่ pd.read_excel ถือว่าเป็น NaN (ให้ผลเหมือนตอนใช้ read_excel เดิม)
+_EXCEL_NA_VALUES = {"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"}
+NAN = float("nan")
+
+
+def _cell_value(val):
+    if val is None: return NAN
+    if isinstance(val, str): return NAN if val in _EXCEL_NA_VALUES else val
+    if isinstance(val, float) and val.is_integer(): return int(val)
+    return val
+
+
+def iter_workbook_sheets(file_path, sheets):
+    # เปิด zip/xml ครั้งเดียวแบบ read-only แล้ว stream ทีละ sheet: (sheet, headers จากแถว 2, iterator ของแถวข้อมูล)
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        for sheet in sheets:
+            if sheet not in wb.sheetnames: continue
+            rows = wb[sheet].iter_rows(min_row=2, values_only=True)
+            header_row = next(rows, None) or ()
+            headers = [f"Unnamed: {i}" if v is None else str(v) for i, v in enumerate(header_row)]
+            yield sheet, headers, rows
+    finally:
+        wb.close()
+
+
+def _find_header(headers, pats, exclude=None):
+    for i, h in enumerate(headers):
+        h_str = h.lower()
+        if any(p in h_str for p in pats):
+            if exclude and exclude in h_str:
+                continue
+            return i
+    return None
+
+
+def _project_rows(rows, spec, key):
+    # spec: [(ชื่อคอลัมน์, index ในแถว หรือ None, ค่า default)] -> สร้างเฉพาะคอลัมน์ที่ต้องใช้
+    # แถวที่ key ว่างถูกข้ามตั้งแต่ตอนอ่าน (เท่ากับ dropna(subset=[key]))
+    picks = [(name, idx) for name, idx, _ in spec if idx is not None]
+    key_idx = next(idx for name, idx, _ in spec if name == key)
+    data = {name: [] for name, _ in picks}
+
+    for row in rows:
+        if key_idx >= len(row): continue
+        if pd.isna(_cell_value(row[key_idx])): continue
+        for name, idx in picks:
+            data[name].append(_cell_value(row[idx]) if idx < len(row) else NAN)
+
+    n = len(data[key])
+    return pd.DataFrame({name: data[name] if idx is not None else [default] * n for name, idx, default in spec})
+
+
+def parse_rfi_sheet(sheet, headers, rows, trade):
+    try:
+        c_doc = _find_header(headers, ["doc ref", "rfas doc"])
+        c_act = _find_header(headers, ["action"])
+        c_desc = _find_header(headers, ["description", "title"])
+        c_stat = _find_header(headers, ["approved status", "status"])
+        c_sub = _find_header(headers, ["submission date"])
+
+        if c_doc is not None:
+            return _project_rows(rows, [
+                ("Doc Ref No.", c_doc, None),
+                ("Trade", None, trade),
+                ("Document Description", c_desc, "-"),
+                ("Action By", c_act, "-"),
+                ("Approved Status", c_stat, "-"),
+                ("Actual Submission Date", c_sub, "-"),
+            ], key="Doc Ref No.")
+    except:
+        pass
+    return None
+
+
+def parse_drawing_sheet(sheet, headers, rows, trade):
+    try:
+        c_rfas = _find_header(headers, ["rfas"])
+        c_desc = _find_header(headers, ["description", "title"])
+        if c_desc is None and len(headers) > 3: c_desc = 3
+
+        if c_rfas is not None:
+            return _project_rows(rows, [
+                ("RFAS Doc No.", c_rfas, None),
+                ("Trade", None, trade),
+                ("Document Description", c_desc, "-"),
+                ("Planned Submission", _find_header(headers, ["planned"]), None),
+                ("Submission Date", _find_header(headers, ["submission"], exclude="planned"), None),
+                ("Consultant Respond Date", _find_header(headers, ["respond"]), None),
+                ("Approval Date", _find_header(headers, ["approval"]), None),
+                ("Revision", _find_header(headers, ["rev"]), "-"),
+                ("Action", _find_header(headers, ["action"]), "-"),
+                ("Status", _find_header(headers, ["status"]), "-"),
+            ], key="RFAS Doc No.")
+    except:
+        pass
+    return None
+
+
+# kind -> parse 1 sheet
+SHEET_PARSERS = {"rfi": parse_rfi_sheet, "drawing": parse_drawing_sheet}
+
+
+def parse_workbook(kind, file_path, sheet_mapping):
+    # งาน 1 ชิ้น = 1 workbook: load_workbook ครั้งเดียวแล้ว parse ทุก sheet ตามลำดับใน mapping -> [DataFrame หรือ None]
+    parse_sheet = SHEET_PARSERS[kind]
+    return [parse_sheet(sheet, headers, rows, sheet_mapping.get(sheet, sheet))
+            for sheet, headers, rows in iter_workbook_sheets(file_path, list(sheet_mapping))]
+
+
+# ------------------------------------------------------------------
+# 📄 PDF TEXT
+# ------------------------------------------------------------------
+def extract_pdf_text(file_path):
+    # งาน 1 ชิ้น = 1 ไฟล์ PDF: คืน (ข้อความ, error)
+    logging.getLogger("pypdf").setLevel(logging.ERROR)  # font/encoding warning ทุกหน้าของไฟล์สแกน
+    try:
+        reader = pypdf.PdfReader(file_path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages), None
+    except Exception as e:
+        return "", str(e)